@@ -19,12 +19,4 @@ import logging as lg
 # docopt arguments are made available here by the CLI
 CLI_ARGS = {}
 
-class NullHandler(lg.Handler):
-
-  """For python <2.7."""
-
-  def emit(self, record):
-    pass
-
-
-lg.getLogger(__name__).addHandler(NullHandler())
+lg.getLogger(__name__).addHandler(lg.NullHandler())
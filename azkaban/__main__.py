@@ -5,10 +5,13 @@
 
 Usage:
   azkaban build [-cp PROJECT] [-a ALIAS | -u URL | [-r] ZIP] [-o OPTION ...]
+  azkaban export [-z] [-a ALIAS | -u URL] EXECUTION DIR
   azkaban info [-p PROJECT] [-f | -o OPTION ... | [-i] JOB ...]
-  azkaban log [-a ALIAS | -u URL] EXECUTION [JOB]
-  azkaban run [-jkp PROJECT] [-a ALIAS | -u URL] [-b | -m MODE] [-e EMAIL ...]
-              [-o OPTION ...] FLOW [JOB ...]
+  azkaban log [-a ALIAS | -u URL] EXECUTION [JOB | --all-jobs]
+              [--head=N | --tail=N | --bytes=RANGE | --grep=PATTERN
+              [--max-count=N] [--context=K]]
+  azkaban run [-jkwp PROJECT] [-a ALIAS | -u URL] [-b | -m MODE]
+              [-e EMAIL ...] [-o OPTION ...] FLOW [JOB ...]
   azkaban schedule [-jkp PROJECT] [-a ALIAS | -u URL] [-b | -m MODE]
                    [-e EMAIL ...] [-o OPTION ...] [-s SPAN] (-d DATE) (-t TIME)
                    FLOW [JOB ...]
@@ -18,6 +21,9 @@ Usage:
 Commmands:
   build*                        Build project and upload to Azkaban or save
                                 locally the resulting archive.
+  export                        Save an execution's status and all its logs
+                                to a directory (job logs, including those of
+                                jobs in embedded flows, under `jobs/`).
   info*                         View information about jobs or files.
   log                           View workflow or job execution logs.
   run                           Run jobs or workflows. If no job is specified,
@@ -27,6 +33,8 @@ Commmands:
   upload                        Upload archive to Azkaban server.
 
 Arguments:
+  DIR                           Directory to export to. It will be created if
+                                it doesn't exist.
   EXECUTION                     Execution ID.
   JOB                           Job name.
   FLOW                          Workflow name. Recall that in the Azkaban world
@@ -41,22 +49,39 @@ Arguments:
 Options:
   -a ALIAS --alias=ALIAS        Alias to saved URL and username. Will also try
                                 to reuse session IDs for later connections.
+  --all-jobs                    Interleave the logs of all the execution's
+                                jobs, each line prefixed by its job's name.
+                                `--grep` and its options then apply to each
+                                job's logs separately, `--head` and `--tail`
+                                to the interleaved lines (`--tail` waits for
+                                the execution to finish). `--bytes` isn't
+                                supported.
   -b --bounce                   Skip execution if workflow is already running.
                                 Shortcut for `--mode=skip`.
+  --bytes=RANGE                 Only show the part of the logs between two
+                                byte offsets, formatted as `START:END` (either
+                                can be omitted, e.g. `1024:`).
   -c --create                   Create the project if it does not exist.
+  --context=K                   Number of lines to show before and after each
+                                line matching the `--grep` pattern.
   -d DATE --date=DATE           Date used for first run of a schedule. It must
                                 be in the format `MM/DD/YYYY`.
   -e EMAIL --email=EMAIL        Email address to be notified when the workflow
                                 finishes (can be specified multiple times).
+  --grep=PATTERN                Only show lines of logs matching this regular
+                                expression.
   -f --files                    List project files instead of jobs. The first
                                 column is the local path of the file, the
                                 second the path of the file in the archive.
   -h --help                     Show this message and exit.
+  --head=N                      Only show the first N lines of logs.
   -i --include-properties       Include project properties with job options.
   -j --jump                     Skip any specified jobs instead of only running
                                 those.
   -k --kill                     Kill worfklow on first job failure.
   -l --log                      Show path to current log file and exit.
+  --max-count=N                 Stop after N lines matching the `--grep`
+                                pattern (no further logs are downloaded).
   -m MODE --mode=MODE           Concurrency mode. The default is to allow
                                 concurrent executions. See also `--bounce`.
   -o OPTION --option=OPTION     Azkaban properties. Can either be the path to
@@ -82,6 +107,8 @@ Options:
                                 will be run only once.
   -t TIME --time=TIME           Time when a schedule should be run. Must be of
                                 the format `hh,mm,(AM|PM),(PDT|UTC|..)`.
+  --tail=N                      Only show the last N lines of logs. Only the
+                                end of the logs is downloaded.
   -u URL --url=URL              Azkaban endpoint (with protocol, and optionally
                                 a username): '[user@]protocol:endpoint'. E.g.
                                 'http://azkaban.server'. The username defaults
@@ -89,6 +116,9 @@ Options:
                                 If you often use the same url, consider using
                                 the `--alias` option instead.
   -v --version                  Show version and exit.
+  -w --wait                     Wait for the execution to finish. The command
+                                then exits with code 1 unless it succeeded.
+  -z --gzip                     Compress exported logs.
 
 Azkaban CLI returns with exit code 1 if an error occurred and 0 otherwise.
 
@@ -99,12 +129,15 @@ from azkaban.project import Project
 from azkaban.remote import Execution, Session
 from azkaban.util import (AzkabanError, Config, catch, flatten, human_readable,
 temppath, read_properties, suppress_urllib_warnings, write_properties)
+from collections import deque
 from docopt import docopt
+from itertools import islice
 from traceback import format_exc
 from requests.exceptions import HTTPError
 import logging as lg
 import os
 import os.path as osp
+import six
 import sys
 
 
@@ -124,6 +157,40 @@ def _forward(args, names):
     for (k, v) in args.items() if k in names
   )
 
+def _parse_range(_bytes):
+  """Parse byte range.
+
+  :param _bytes: String formatted as `START:END`, either bound being optional.
+
+  """
+  try:
+    start, end = _bytes.split(':')
+    return int(start or 0), int(end) if end else None
+  except ValueError:
+    raise AzkabanError('Invalid byte range: %r.', _bytes)
+
+def _parse_count(_count, option):
+  """Parse a count option's argument.
+
+  :param _count: Argument, `None` if the option wasn't specified.
+  :param option: Option name, used in error messages.
+
+  Returns a non-negative integer, or `None`.
+
+  """
+  if _count is None:
+    return None
+  try:
+    count = int(_count)
+  except ValueError:
+    count = -1
+  if count < 0:
+    raise AzkabanError(
+      'Invalid `%s` value: %r (expected a non-negative integer).',
+      option, _count
+    )
+  return count
+
 def _parse_option(_option):
   """Parse `--option` argument.
 
@@ -163,7 +230,9 @@ def _parse_project(_project, require_project=False):
     + If the above attempt raises an `ImportError`, we interpret it as a name.
 
   """
-  default_project = Config().get_option('azkaban', 'default.project', 'jobs')
+  default_project = Config.shared().get_option(
+    'azkaban', 'default.project', 'jobs'
+  )
   exceptions = {}
   projects = {}
 
@@ -275,7 +344,7 @@ def _get_session(url, alias):
   :param alias: Alias name.
 
   """
-  config = Config()
+  config = Config.shared()
   if url:
     return Session(url=url, config=config)
   else:
@@ -355,14 +424,56 @@ def view_info(project, _files, _option, _job, _include_properties):
           % ('J' if name in dependencies else 'F', name, )
         )
 
-def view_log(_execution, _job, _url, _alias):
+def view_log(_execution, _job, _url, _alias, _all_jobs, _head, _tail,
+  _bytes, _grep, _max_count, _context):
   """View workflow or job execution logs."""
   session = _get_session(_url, _alias)
   exc = Execution(session, _execution)
-  logs = exc.job_logs(_job[0]) if _job else exc.logs()
+  if _bytes and _all_jobs:
+    raise AzkabanError('Byte ranges are not supported with `--all-jobs`.')
+  head = _parse_count(_head, '--head')
+  tail = _parse_count(_tail, '--tail')
+  grep_kwargs = {
+    'pattern': _grep,
+    'max_count': _parse_count(_max_count, '--max-count'),
+    'context': _parse_count(_context, '--context') or 0,
+  }
   try:
+    if _bytes:
+      start, end = _parse_range(_bytes)
+      if _job:
+        chunks = exc.job_logs_range(_job[0], start, end)
+      else:
+        chunks = exc.logs_range(start, end)
+      for chunk in chunks:
+        sys.stdout.write(chunk.encode('utf-8') if six.PY2 else chunk)
+      return
+    if _all_jobs:
+      logs = (
+        '[%s] %s' % job_line for job_line in exc.all_job_logs(**grep_kwargs)
+      )
+      if tail is not None:
+        logs = deque(logs, maxlen=tail)
+    elif _grep:
+      if _job:
+        logs = exc.grep_job_logs(_job[0], **grep_kwargs)
+      else:
+        logs = exc.grep_logs(**grep_kwargs)
+    elif tail is not None:
+      if _job:
+        logs = exc.job_logs_tail(_job[0], tail)
+      else:
+        logs = exc.logs_tail(tail)
+    elif _job:
+      logs = exc.job_logs(_job[0])
+    else:
+      logs = exc.logs()
+    if head is not None:
+      logs = islice(logs, head)
     for line in logs:
-      sys.stdout.write('%s\n' % (line.encode('utf-8'), ))
+      if six.PY2:
+        line = line.encode('utf-8')
+      sys.stdout.write('%s\n' % (line, ))
   except HTTPError:
     # Azkaban responds with 500 if the execution or job isn't found
     if _job:
@@ -373,7 +484,7 @@ def view_log(_execution, _job, _url, _alias):
       raise AzkabanError('Execution %s not found.', _execution)
 
 def run_workflow(project_name, _flow, _job, _url, _alias, _bounce, _kill,
-  _email, _option, _jump, _mode):
+  _email, _option, _jump, _mode, _wait):
   """Run workflow."""
   session = _get_session(_url, _alias)
   kwargs = {
@@ -396,6 +507,11 @@ def run_workflow(project_name, _flow, _job, _url, _alias, _bounce, _kill,
     'Details at %s/executor?execid=%s\n'
     % (_flow, exec_id, job_names, session.url, exec_id)
   )
+  if _wait:
+    status = Execution(session, exec_id).wait()['status']
+    if status != 'SUCCEEDED':
+      raise AzkabanError('Execution %s finished as %s.', exec_id, status)
+    sys.stdout.write('Execution %s succeeded.\n' % (exec_id, ))
 
 def schedule_workflow(project_name, _date, _time, _span, _flow, _job, _url,
   _alias, _bounce, _kill, _email, _option, _jump, _mode):
@@ -421,6 +537,20 @@ def schedule_workflow(project_name, _date, _time, _span, _flow, _job, _url,
     'Flow %s scheduled successfully.\n' % (_flow, )
   )
 
+def export_execution(_execution, _dir, _url, _alias, _gzip):
+  """Export execution status and logs."""
+  session = _get_session(_url, _alias)
+  paths = Execution(session, _execution).export(_dir, compress=_gzip)
+  sys.stdout.write(
+    'Execution %s successfully exported to %r (%s files, size: %s).\n'
+    % (
+      _execution,
+      _dir,
+      len(paths),
+      human_readable(sum(osp.getsize(path) for path in paths)),
+    )
+  )
+
 def upload_project(project_name, _zip, _url, _alias, _create):
   """Upload project."""
   session = _get_session(_url, _alias)
@@ -478,7 +608,7 @@ def main(argv=None):
   # enable general logging
   logger = lg.getLogger()
   logger.setLevel(lg.DEBUG)
-  handler = Config().get_file_handler('azkaban')
+  handler = Config.shared().get_file_handler('azkaban')
   if handler:
     logger.addHandler(handler)
   # capture pesky unverified requests warnings
@@ -504,7 +634,17 @@ def main(argv=None):
     )
   elif args['log']:
     view_log(
-      **_forward(args, ['EXECUTION', 'JOB', '--url', '--alias'])
+      **_forward(
+        args,
+        [
+          'EXECUTION', 'JOB', '--url', '--alias', '--all-jobs', '--head',
+          '--tail', '--bytes', '--grep', '--max-count', '--context',
+        ]
+      )
+    )
+  elif args['export']:
+    export_execution(
+      **_forward(args, ['EXECUTION', 'DIR', '--url', '--alias', '--gzip'])
     )
   elif args['info']:
     view_info(
@@ -518,7 +658,7 @@ def main(argv=None):
         args,
         [
           'FLOW', 'JOB', '--bounce', '--url', '--alias', '--kill', '--email',
-          '--option', '--jump', '--mode',
+          '--option', '--jump', '--mode', '--wait',
         ]
       )
     )
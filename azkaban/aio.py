@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""Asyncio interaction module (python 3.6+).
+
+This contains the :class:`AsyncSession` and :class:`AsyncExecution` classes,
+coroutine counterparts of :class:`~azkaban.remote.Session` and
+:class:`~azkaban.remote.Execution`. They can be used to follow many executions
+from a single event loop:
+
+.. code:: python
+
+  async def follow(session, exec_id):
+    async for line in AsyncExecution(session, exec_id).logs():
+      print(line)
+
+  session = AsyncSession.from_alias('foo')
+  loop.run_until_complete(asyncio.gather(*(follow(session, i) for i in ids)))
+
+Requests are delegated to an underlying :class:`~azkaban.remote.Session` (so
+URL parsing, session ID caching and error handling are identical) and run on a
+bounded pool of worker threads sharing its keep-alive connections.
+
+"""
+
+from .remote import (ExecutionMonitor, Session, _LogTail, _TERMINAL_STATUSES,
+  _consume_logs, _replay_logs, _report_job_status)
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from requests.exceptions import HTTPError
+import asyncio
+import logging as lg
+
+
+_logger = lg.getLogger(__name__)
+
+
+async def _replay(session, exec_id, tail, job=None, batch_size=1024):
+  """Asynchronous version of :func:`~azkaban.remote._replay_logs`.
+
+  :param session: :class:`AsyncSession` instance.
+  :param exec_id: Execution ID.
+  :param tail: :class:`~azkaban.remote._LogTail` instance.
+  :param job: Job name, `None` for the execution's logs.
+  :param batch_size: Number of lines read from disk at once.
+
+  Cached lines are read in batches from the worker pool, so that disk reads
+  don't block the event loop.
+
+  """
+  lines = _replay_logs(session.session, exec_id, tail, job)
+  while True:
+    batch = await session._run(list, islice(lines, batch_size))
+    if not batch:
+      break
+    for line in batch:
+      yield line
+
+def _coroutine(name):
+  """Create coroutine method delegating to the underlying session.
+
+  :param name: Name of :class:`~azkaban.remote.Session` method.
+
+  """
+  async def method(self, *args, **kwargs):
+    return await self._run(getattr(self.session, name), *args, **kwargs)
+  method.__name__ = name
+  method.__doc__ = (
+    'Coroutine version of :meth:`~azkaban.remote.Session.%s`.' % (name, )
+  )
+  return method
+
+
+class AsyncSession(object):
+
+  """Asynchronous Azkaban session.
+
+  :param session: :class:`~azkaban.remote.Session` instance used to emit
+    requests.
+  :param max_workers: Maximum number of requests in flight at any time.
+    Defaults to the session's connection pool size.
+
+  """
+
+  def __init__(self, session, max_workers=None):
+    self.session = session
+    self._executor = ThreadPoolExecutor(max_workers or session.pool_maxsize)
+
+  def __repr__(self):
+    return '<%s(url=\'%s\')>' % (self.__class__.__name__, self.session)
+
+  async def __aenter__(self):
+    return self
+
+  async def __aexit__(self, *exc_info):
+    self.close()
+
+  @property
+  def url(self):
+    """Azkaban server URL."""
+    return self.session.url
+
+  def close(self):
+    """Release worker threads and pooled connections."""
+    self._executor.shutdown(wait=False)
+    self.session.close()
+
+  async def _run(self, func, *args, **kwargs):
+    """Run blocking function in the worker pool.
+
+    :param func: Function.
+    :param args: Positional arguments forwarded to `func`.
+    :param kwargs: Keyword arguments forwarded to `func`.
+
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(
+      self._executor, partial(func, *args, **kwargs)
+    )
+
+  get_workflow_executions = _coroutine('get_workflow_executions')
+  get_running_workflows = _coroutine('get_running_workflows')
+  get_execution_status = _coroutine('get_execution_status')
+  get_execution_updates = _coroutine('get_execution_updates')
+  get_execution_logs = _coroutine('get_execution_logs')
+  get_job_logs = _coroutine('get_job_logs')
+  cancel_execution = _coroutine('cancel_execution')
+  get_projects = _coroutine('get_projects')
+  create_project = _coroutine('create_project')
+  delete_project = _coroutine('delete_project')
+  run_workflow = _coroutine('run_workflow')
+  schedule_workflow = _coroutine('schedule_workflow')
+  unschedule_workflow = _coroutine('unschedule_workflow')
+  schedule_cron_workflow = _coroutine('schedule_cron_workflow')
+  get_schedule = _coroutine('get_schedule')
+  get_sla = _coroutine('get_sla')
+  set_sla = _coroutine('set_sla')
+  upload_project = _coroutine('upload_project')
+  get_workflows = _coroutine('get_workflows')
+  get_workflow_info = _coroutine('get_workflow_info')
+
+  @classmethod
+  def from_alias(cls, alias, config=None, max_workers=None):
+    """Create configured asynchronous session from an alias.
+
+    :param alias: Alias name.
+    :param config: Azkaban configuration object.
+    :param max_workers: Cf. :class:`AsyncSession`.
+
+    """
+    return cls(Session.from_alias(alias, config=config), max_workers)
+
+
+class AsyncExecution(object):
+
+  """Remote workflow execution, asynchronous version.
+
+  :param session: :class:`AsyncSession` instance.
+  :param exec_id: Execution ID.
+
+  """
+
+  def __init__(self, session, exec_id):
+    self._session = session
+    self.exec_id = exec_id
+    self.monitor = ExecutionMonitor(session.session, exec_id)
+
+  @property
+  def url(self):
+    """Execution URL."""
+    return '%s/executor?execid=%s' % (self._session.url, self.exec_id)
+
+  async def status(self, max_age=0):
+    """Execution status.
+
+    :param max_age: Cf. :meth:`~azkaban.remote.ExecutionMonitor.poll`.
+
+    The status is shared with the execution's monitor, it must not be
+    modified.
+
+    """
+    return await self._session._run(self.monitor.poll, max_age)
+
+  async def snapshot(self, max_age=0):
+    """Execution status as an :class:`~azkaban.remote.ExecutionSnapshot`.
+
+    :param max_age: Cf. :meth:`~azkaban.remote.ExecutionMonitor.poll`.
+
+    """
+    return await self._session._run(self.monitor.snapshot, max_age)
+
+  async def cancel(self):
+    """Cancel execution."""
+    await self._session.cancel_execution(self.exec_id)
+
+  async def events(self, delay=5):
+    """Execution status transition asynchronous generator.
+
+    :param delay: cf. :meth:`~azkaban.remote.Execution.events`
+
+    Yields :class:`~azkaban.remote.ExecutionEvent` instances.
+
+    """
+    snapshot = await self.snapshot()
+    while not snapshot.finished:
+      await asyncio.sleep(delay)
+      snapshot, events = await self._session._run(
+        self.monitor.get_transitions, snapshot, delay
+      )
+      for event in events:
+        yield event
+
+  async def logs(self, delay=5, min_delay=0.5, backoff=2, max_limit=1 << 22,
+    raw=False):
+    """Execution log asynchronous generator.
+
+    :param delay: cf. :meth:`~azkaban.remote.Execution.logs`
+    :param min_delay: cf. :meth:`~azkaban.remote.Execution.logs`
+    :param backoff: cf. :meth:`~azkaban.remote.Execution.logs`
+    :param max_limit: cf. :meth:`~azkaban.remote.Execution.logs`
+    :param raw: cf. :meth:`~azkaban.remote.Execution.logs`
+
+    Yields line by line.
+
+    """
+    tail = _LogTail(min_delay, delay, backoff, max_limit=max_limit, raw=raw)
+    session = self._session.session
+    async for line in _replay(self._session, self.exec_id, tail):
+      yield line
+    while not tail.done:
+      logs = await self._session.get_execution_logs(
+        exec_id=self.exec_id,
+        offset=tail.offset,
+        limit=tail.limit,
+      )
+      lines = await self._session._run(
+        _consume_logs, session, self.exec_id, tail, logs
+      )
+      for line in lines:
+        yield line
+      if tail.done:
+        break
+      if tail.status_due:
+        status = await self.status(delay)
+        tail.set_running(not status['status'] in _TERMINAL_STATUSES)
+      await asyncio.sleep(tail.delay)
+
+  async def job_logs(self, job, delay=5, min_delay=0.5, backoff=2,
+    max_limit=1 << 22, raw=False):
+    """Job log asynchronous generator.
+
+    :param job: job name
+    :param delay: cf. :meth:`~azkaban.remote.Execution.logs`
+    :param min_delay: cf. :meth:`~azkaban.remote.Execution.logs`
+    :param backoff: cf. :meth:`~azkaban.remote.Execution.logs`
+    :param max_limit: cf. :meth:`~azkaban.remote.Execution.logs`
+    :param raw: cf. :meth:`~azkaban.remote.Execution.logs`
+
+    Yields line by line.
+
+    """
+    tail = _LogTail(min_delay, delay, backoff, max_limit=max_limit, raw=raw)
+    session = self._session.session
+    async for line in _replay(self._session, self.exec_id, tail, job):
+      yield line
+    while not tail.done:
+      try:
+        logs = await self._session.get_job_logs(
+          exec_id=self.exec_id,
+          job=job,
+          offset=tail.offset,
+          limit=tail.limit,
+        )
+      except HTTPError as err:
+        # if Azkaban is hanging, the job might be stuck in preparing stage
+        preparing = False
+        while True:
+          await asyncio.sleep(delay)
+          snapshot = await self.snapshot(delay)
+          if snapshot.get_status(job) == 'PREPARING':
+            if not preparing:
+              preparing = True
+              _logger.debug(
+                'Job %s in execution %s is still preparing.', job, self.exec_id
+              )
+          else:
+            break
+        if not preparing:
+          # something else is causing the error
+          raise err
+      else:
+        lines = await self._session._run(
+          _consume_logs, session, self.exec_id, tail, logs, job
+        )
+        for line in lines:
+          yield line
+        if tail.done:
+          break
+        if tail.status_due:
+          _report_job_status(tail, await self.snapshot(delay), job)
+        await asyncio.sleep(tail.delay)
+
+  @classmethod
+  async def start(cls, session, *args, **kwargs):
+    """Convenience coroutine to start a new execution.
+
+    :param session: :class:`AsyncSession` instance.
+    :param args: Cf. :meth:`~azkaban.remote.Session.run_workflow`.
+    :param kwargs: Cf. :meth:`~azkaban.remote.Session.run_workflow`.
+
+    """
+    res = await session.run_workflow(*args, **kwargs)
+    return cls(session, res['execid'])
@@ -0,0 +1,408 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""Caching module.
+
+This contains the :class:`MetadataCache` and :class:`LogCache` classes, which
+can be attached to a :class:`~azkaban.remote.Session` to avoid repeatedly
+fetching project and flow metadata, and execution logs respectively, from the
+Azkaban server.
+
+"""
+
+from .util import AzkabanError, lock_file, write_atomically
+from codecs import getincrementaldecoder
+from collections import OrderedDict
+from copy import deepcopy
+from hashlib import sha1
+from os.path import exists, join
+from threading import Lock
+from time import time
+import io
+import json
+import logging as lg
+import os
+
+
+_logger = lg.getLogger(__name__)
+
+
+class MetadataCache(object):
+
+  """In-process LRU cache with expiring entries, optionally persisted to disk.
+
+  :param ttl: Time in seconds after which an entry expires.
+  :param max_size: Maximum number of entries kept. When full, the least
+    recently used entry is evicted.
+  :param path: Optional path to a file used to persist entries across
+    processes. It will be created if it doesn't exist.
+
+  Keys are tuples of strings. Entries can be invalidated by key prefix, which
+  :class:`~azkaban.remote.Session` uses to drop all entries of a project
+  (the session's keys are of the form `(url, project, kind[, flow])`).
+
+  When persisted, each change is merged (under a lock) with the entries saved
+  by other processes, so that their updates and invalidations aren't lost.
+  Values are copied in and out of the cache, so callers can't alter them.
+
+  """
+
+  def __init__(self, ttl=300, max_size=256, path=None):
+    self.ttl = ttl
+    self.max_size = max_size
+    self.path = path
+    self._entries = OrderedDict() # key -> (expiration, value)
+    self._lock = Lock()
+    if path and exists(path):
+      self._entries = self._load()
+
+  def __len__(self):
+    return len(self._entries)
+
+  def get(self, key, default=None):
+    """Get a cached value.
+
+    :param key: Tuple of strings.
+    :param default: Value returned if the key isn't cached or has expired.
+
+    """
+    key = tuple(key)
+    with self._lock:
+      try:
+        expiration, value = self._entries.pop(key)
+      except KeyError:
+        return default
+      if expiration < time():
+        _logger.debug('Cache entry %r expired.', key)
+        return default
+      self._entries[key] = (expiration, value) # mark as recently used
+      return deepcopy(value)
+
+  def set(self, key, value):
+    """Cache a value.
+
+    :param key: Tuple of strings.
+    :param value: JSON serializable value.
+
+    """
+    key = tuple(key)
+    entry = (time() + self.ttl, deepcopy(value))
+
+    def _set(entries):
+      """Add the entry as most recently used."""
+      entries.pop(key, None)
+      entries[key] = entry
+
+    with self._lock:
+      self._update(_set)
+
+  def invalidate(self, *prefix):
+    """Remove all entries whose key starts with the given prefix.
+
+    :param \*prefix: Key prefix. If empty, the whole cache is cleared.
+
+    """
+    size = len(prefix)
+
+    def _remove(entries):
+      """Remove matching entries, returning how many there were."""
+      keys = [key for key in entries if key[:size] == prefix]
+      for key in keys:
+        del entries[key]
+      return len(keys)
+
+    with self._lock:
+      count = self._update(_remove)
+    if count:
+      _logger.debug('Invalidated %s cache entries.', count)
+
+  def _load(self):
+    """Load non-expired entries from disk."""
+    try:
+      with open(self.path) as reader:
+        entries = json.load(reader)
+    except ValueError:
+      raise AzkabanError('Invalid cache file %r.', self.path)
+    now = time()
+    return OrderedDict(
+      (tuple(key), (expiration, value))
+      for key, expiration, value in entries[-self.max_size:]
+      if expiration >= now
+    )
+
+  def _update(self, change):
+    """Apply a change to the entries, persisting them if a path was specified.
+
+    :param change: Function called with the entries, which it updates in
+      place. Its return value is returned.
+
+    When persisted, the change is applied to the entries currently on disk
+    (which include other processes' changes), and these become the cache's.
+
+    """
+    if not self.path:
+      res = change(self._entries)
+      self._trim(self._entries)
+      return res
+    with lock_file(self.path):
+      entries = self._load() if exists(self.path) else OrderedDict()
+      res = change(entries)
+      self._trim(entries)
+      write_atomically(self.path, json.dumps([
+        [key, expiration, value]
+        for key, (expiration, value) in entries.items()
+      ]))
+    self._entries = entries
+    return res
+
+  def _trim(self, entries):
+    """Evict least recently used entries until they fit the cache's size.
+
+    :param entries: Entries.
+
+    """
+    while len(entries) > self.max_size:
+      entries.popitem(last=False)
+
+
+class LogCache(object):
+
+  """On-disk cache of execution and job logs.
+
+  :param path: Directory where logs are stored. It will be created if it
+    doesn't exist.
+  :param max_size: Maximum total size in bytes of the directory's logs. When
+    exceeded, the least recently used logs are evicted.
+  :param save_interval: Minimum time in seconds between two saves of the
+    cache's index (logs are always saved once complete). Call :meth:`flush`
+    to save it sooner.
+
+  Keys are tuples of strings (:class:`~azkaban.remote.Execution` uses `(url,
+  exec_id, job)`, `job` being empty for flow logs). Each log is stored in its
+  own file along with the server offset it ends at, so that following it can
+  resume where it was left off. Logs marked as complete don't need to be
+  fetched again at all.
+
+  Several caches (e.g. in different processes) can share the same directory.
+  Log files are only written under a lock and always hold a prefix of their
+  log, so each cache can check that a file still holds the data it recorded.
+  Index updates are merged with the ones saved by other caches, and logs are
+  evicted when saving the merged index, so the size limit applies to all the
+  logs in the directory.
+
+  """
+
+  def __init__(self, path, max_size=1 << 30, save_interval=1):
+    self.path = path
+    self.max_size = max_size
+    self.save_interval = save_interval
+    self._index_path = join(path, 'index.json')
+    self._entries = OrderedDict() # name -> [key, offset, size, complete]
+    self._size = 0 # total size of the entries' logs
+    self._changed = set() # names of entries updated since the last save
+    self._saved = time()
+    self._lock = Lock()
+    if not exists(path):
+      os.makedirs(path)
+    elif exists(self._index_path):
+      with lock_file(self._index_path):
+        for name, entry in self._load():
+          self._entries[name] = entry
+          self._size += entry[2]
+
+  def __len__(self):
+    return len(self._entries)
+
+  def get(self, key):
+    """Get the state of a cached log.
+
+    :param key: Tuple of strings.
+
+    Returns an `(offset, complete)` tuple, or `None` if the log isn't cached.
+
+    """
+    name = self._get_name(key)
+    with self._lock:
+      entry = self._entries.get(name)
+      if not entry:
+        return None
+      if _get_size(join(self.path, name)) < entry[2]:
+        _logger.warning('Cached log %r missing or truncated.', key)
+        self._forget(name)
+        return None
+      self._entries[name] = self._entries.pop(name) # mark as recently used
+      self._changed.add(name)
+      return entry[1], entry[3]
+
+  def read(self, key, chunk_size=1 << 16):
+    """Read a cached log.
+
+    :param key: Tuple of strings.
+    :param chunk_size: Size of each chunk read.
+
+    Returns a generator of chunks of text. Only data recorded before the call
+    is read.
+
+    """
+    name = self._get_name(key)
+    with self._lock:
+      entry = self._entries.get(name)
+      size = entry[2] if entry else 0
+    if size:
+      decoder = getincrementaldecoder('utf-8')()
+      with io.open(join(self.path, name), 'rb') as reader:
+        while size > 0:
+          chunk = reader.read(min(chunk_size, size))
+          if not chunk:
+            break
+          size -= len(chunk)
+          # characters cut by the chunk boundary are held until the next one
+          yield decoder.decode(chunk, final=size <= 0)
+
+  def update(self, key, data, start, end, complete=False):
+    """Record a newly fetched page of logs.
+
+    :param key: Tuple of strings.
+    :param data: Page data.
+    :param start: Server offset the page starts at.
+    :param end: Server offset the page ends at.
+    :param complete: Whether the log is over.
+
+    Pages which don't directly follow the cached data (or, for logs not yet
+    cached, don't start at the beginning of the log) are ignored, and so are
+    empty pages of incomplete logs.
+
+    """
+    name = self._get_name(key)
+    with self._lock:
+      entry = self._entries.get(name)
+      if not entry:
+        if start:
+          return # we don't have the beginning of this log
+        entry = [list(key), 0, 0, False]
+      elif entry[1] != start or entry[3]:
+        return
+      if not data and not complete:
+        return
+      raw = data.encode('utf-8')
+      path = join(self.path, name)
+      with lock_file(self._index_path): # also guards log files
+        size = _get_size(path)
+        if size < entry[2]:
+          # another cache truncated the file, we can't trust our entry anymore
+          _logger.debug('Cached log %r changed concurrently.', key)
+          self._forget(name)
+          return
+        with io.open(path, 'r+b' if exists(path) else 'wb') as writer:
+          # drop any data written past our entry (e.g. by a cache which didn't
+          # save its index), this is safe since files only hold log prefixes
+          writer.seek(entry[2])
+          writer.truncate()
+          writer.write(raw)
+      self._entries.pop(name, None)
+      self._entries[name] = entry
+      entry[1:] = [end, entry[2] + len(raw), complete]
+      self._size += len(raw)
+      self._changed.add(name)
+      if (
+        complete or
+        self._size > self.max_size or
+        time() - self._saved >= self.save_interval
+      ):
+        self._save()
+
+  def flush(self):
+    """Save the cache's index, if it was used since it was last saved."""
+    with self._lock:
+      if self._changed:
+        self._save()
+
+  def _evict(self, entries):
+    """Remove logs until the directory's fit the cache's size.
+
+    :param entries: Merged index, evicted logs' entries are removed from it.
+
+    This must be called with the index locked. Entries whose file was evicted
+    or truncated by another cache are dropped from the index. Files missing
+    from the index (e.g. logs not yet saved by another cache, or dropped after
+    being found truncated) are evicted first, then the least recently used
+    logs.
+
+    """
+    sizes = dict(
+      (name, _get_size(join(self.path, name)))
+      for name in os.listdir(self.path)
+      if name.endswith('.log')
+    )
+    for name, entry in list(entries.items()):
+      if sizes.get(name, 0) < entry[2]:
+        del entries[name]
+    total = sum(sizes.values())
+    if total <= self.max_size:
+      return
+    names = [name for name in sizes if not name in entries] + list(entries)
+    for name in names:
+      if total <= self.max_size:
+        break
+      _logger.debug('Evicting cached log %s.', name)
+      entries.pop(name, None)
+      entry = self._entries.pop(name, None)
+      if entry:
+        self._size -= entry[2]
+      try:
+        os.remove(join(self.path, name))
+      except OSError:
+        pass
+      total -= sizes.get(name, 0)
+
+  def _forget(self, name):
+    """Drop an entry from memory only (its file might be used by others).
+
+    :param name: Entry name.
+
+    """
+    entry = self._entries.pop(name)
+    self._size -= entry[2]
+    self._changed.discard(name)
+
+  def _get_name(self, key):
+    """Name of the file storing a log.
+
+    :param key: Tuple of strings.
+
+    """
+    digest = sha1(json.dumps(list(key)).encode('utf-8')).hexdigest()
+    return '%s.log' % (digest, )
+
+  def _load(self):
+    """Load index from disk, returning a list of `(name, entry)` tuples."""
+    try:
+      with open(self._index_path) as reader:
+        return json.load(reader)
+    except ValueError:
+      raise AzkabanError('Invalid log cache index %r.', self._index_path)
+
+  def _save(self):
+    """Persist index to disk, merging it with entries saved by other caches."""
+    with lock_file(self._index_path):
+      entries = OrderedDict(self._load() if exists(self._index_path) else [])
+      for name in self._entries: # least recently used first
+        if name in self._changed:
+          entries.pop(name, None)
+          entries[name] = self._entries[name]
+      self._evict(entries)
+      write_atomically(self._index_path, json.dumps(list(entries.items())))
+    self._changed.clear()
+    self._saved = time()
+
+
+def _get_size(path):
+  """Size of a file, 0 if it doesn't exist.
+
+  :param path: Path to file.
+
+  """
+  try:
+    return os.path.getsize(path)
+  except OSError:
+    return 0
@@ -83,7 +83,11 @@ class PigJob(Job):
 
   def __init__(self, *options):
     super(PigJob, self).__init__(
-      {'type': Config().get_option('azkabanpig', 'default.type', 'pig')},
+      {
+        'type': Config.shared().get_option(
+          'azkabanpig', 'default.type', 'pig'
+        ),
+      },
       *options
     )
     try:
@@ -130,14 +134,15 @@ class _PigProject(Project):
     """
     ok_statuses = set(['RUNNING', 'SUCCEEDED'])
     for job in self.ordered_jobs:
-      while execution.status['status'] == 'PREPARING':
+      while execution.monitor.poll(delay)['status'] == 'PREPARING':
         # Delay log query until job is done preparing otherwise the log file
         # won't exist yet (and the server will send a 500 back).
         self._logger.warning('Job %s preparing.', job)
         sleep(delay)
       for line in execution.job_logs(job):
         yield line
-      if not execution.status['status'] in ok_statuses:
+      # fetch a fresh status, the job may have just failed
+      if not execution.monitor.poll(0)['status'] in ok_statuses:
         raise AzkabanError('Job %s failed.', job)
       else:
         self._logger.info('Job %s finished.', job)
@@ -147,7 +152,7 @@ class _PigProject(Project):
 def main():
   """AzkabanPig entry point."""
   args = docopt(__doc__)
-  cfg = Config()
+  cfg = Config.shared()
   # activate logging
   logger = lg.getLogger()
   logger.setLevel(lg.DEBUG)
@@ -8,42 +8,153 @@ a remote Azkaban server.
 
 """
 
-from .util import AzkabanError, Config, Adapter, MultipartForm, flatten
+from .cache import LogCache, MetadataCache
+from .util import (AzkabanError, Config, Adapter, MultipartForm, RateLimiter,
+  flatten)
 from getpass import getpass, getuser
-from os.path import basename, exists
+from collections import deque, namedtuple
+from email.utils import mktime_tz, parsedate_tz
+from functools import partial
+from multiprocessing.pool import ThreadPool
+from random import uniform
+from os.path import basename, dirname, exists, join
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
 from six import string_types
 from six.moves.configparser import NoOptionError, NoSectionError
+from six.moves.queue import Empty, Full, Queue
+from six.moves.http_cookiejar import DefaultCookiePolicy
 from six.moves.urllib.parse import urlparse
-from time import sleep
+from threading import Event, Lock, Thread
+from time import sleep, time
 from warnings import warn
+import gzip
+import io
+import json
 import logging as lg
+import os
 import requests as rq
 import re
 
+try:
+  from requests.packages.urllib3.exceptions import NewConnectionError
+except ImportError: # requests < 2.9
+  NewConnectionError = None
+
 
 _logger = lg.getLogger(__name__)
 
+# Markers present in responses when the server rejects a session ID: the usual
+# non API error response (login page), the special case for the API, and the
+# error returned when running a flow's jobs.
+_SESSION_ERROR_PATTERN = re.compile(
+  r'<!-- /\.login -->|Login error|"error" : "session"'
+)
+
+# Statuses of executions and jobs which won't change anymore.
+_TERMINAL_STATUSES = frozenset([
+  'SUCCEEDED', 'FAILED', 'KILLED', 'CANCELLED', 'SKIPPED', 'DISABLED',
+  'FAILED_SUCCEEDED',
+])
+
+# Statuses of jobs which have started running (and therefore have logs).
+_STARTED_STATUSES = frozenset([
+  'RUNNING', 'KILLING', 'PAUSED', 'SUCCEEDED', 'FAILED', 'KILLED',
+  'FAILED_SUCCEEDED',
+])
+
+# Session rejections are short pages, there is no need to scan larger bodies
+# (e.g. log pages) for the markers above.
+_SESSION_ERROR_MAX_SIZE = 1 << 16
 
-def _azkaban_request(method, url, **kwargs):
+
+def _azkaban_request(method, url, client=rq, retry=None, idempotent=True,
+  limiter=None, **kwargs):
   """Make request to azkaban server and catch common errors.
 
   :param method: GET, POST, etc.
   :param url: Endpoint url.
+  :param client: Object used to emit the request. Defaults to the `requests`
+    module (i.e. a new connection per request), a `requests.Session` can be
+    passed to reuse pooled connections.
+  :param retry: :class:`RetryPolicy` used to retry transient failures. By
+    default requests are only attempted once.
+  :param idempotent: Whether the request can safely be sent more than once.
+    If not, it will only be retried when it is certain that it didn't reach
+    the server (e.g. when the connection was refused).
+  :param limiter: :class:`~azkaban.util.RateLimiter` throttling each attempt.
   :param **kwargs: Arguments forwarded to the request handler.
 
   This function is meant to handle common errors and return a more helpful
   message than the default one.
 
   """
+  start = time()
+  attempt = 0
+  while True:
+    attempt += 1
+    if limiter:
+      limiter.acquire()
+    try:
+      response = client.request(url=url, method=method, **kwargs)
+    except rq.ConnectionError as err:
+      if retry and (idempotent or _is_unsent(err)):
+        delay = retry.get_delay(attempt, time() - start)
+      else:
+        delay = None
+      if delay is None:
+        raise AzkabanError(
+          'Unable to connect to Azkaban server %r: %s', url, err
+        )
+      reason = 'connection error'
+    except rq.exceptions.MissingSchema:
+      raise AzkabanError('Invalid Azkaban server url: %r.', url)
+    else:
+      if (
+        not retry or
+        not idempotent or
+        not response.status_code in retry.statuses
+      ):
+        return response
+      delay = retry.get_delay(attempt, time() - start, response)
+      if delay is None:
+        return response
+      reason = 'status %s' % (response.status_code, )
+    _logger.warning(
+      'Request to %s failed (%s), retrying in %.1f seconds.',
+      url, reason, delay
+    )
+    sleep(delay)
+
+def _is_unsent(err):
+  """Check whether a connection error happened before sending the request.
+
+  :param err: `requests.ConnectionError`.
+
+  """
+  if isinstance(err, rq.exceptions.ConnectTimeout):
+    return True
+  if not NewConnectionError:
+    return False # older requests versions don't let us tell
+  reason = getattr(err.args[0], 'reason', None) if err.args else None
+  return isinstance(reason, NewConnectionError)
+
+def _parse_retry_after(response):
+  """Extract delay in seconds from a response's `Retry-After` header.
+
+  :param response: Request response object.
+
+  Returns `None` if the header is missing or invalid.
+
+  """
+  value = response.headers.get('Retry-After')
+  if not value:
+    return None
   try:
-    response = rq.request(url=url, method=method, **kwargs)
-  except rq.ConnectionError as err:
-    raise AzkabanError('Unable to connect to Azkaban server %r: %s', url, err)
-  except rq.exceptions.MissingSchema:
-    raise AzkabanError('Invalid Azkaban server url: %r.', url)
-  else:
-    return response
+    return max(0, float(value))
+  except ValueError:
+    date = parsedate_tz(value) # the header can also be an HTTP date
+    return max(0, mktime_tz(date) - time()) if date else None
 
 def _extract_json(response):
   """Extract JSON from Azkaban response, gracefully handling errors.
@@ -64,6 +175,39 @@ def _extract_json(response):
     else:
       return json
 
+def _is_session_error(response):
+  """Check whether the server rejected a request's session ID.
+
+  :param response: Request response object.
+
+  """
+  return (
+    len(response.content) <= _SESSION_ERROR_MAX_SIZE and
+    bool(_SESSION_ERROR_PATTERN.search(response.text))
+  )
+
+def _create_client(pool_connections, pool_maxsize, max_retries):
+  """Create `requests` session holding a pool of keep-alive connections.
+
+  :param pool_connections: Number of per-host connection pools to cache.
+  :param pool_maxsize: Maximum number of connections kept per host.
+  :param max_retries: Number of retries on failed connections.
+
+  Cookies sent back by the server are not persisted: the session ID is always
+  included explicitly by :class:`Session`.
+
+  """
+  client = rq.Session()
+  client.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+  adapter = HTTPAdapter(
+    pool_connections=pool_connections,
+    pool_maxsize=pool_maxsize,
+    max_retries=max_retries,
+  )
+  client.mount('http://', adapter)
+  client.mount('https://', adapter)
+  return client
+
 def _parse_url(url):
   """Parse url, returning tuple of (username, password, address)
 
@@ -107,6 +251,111 @@ def _parse_url(url):
             '%s://%s:%s' % (parsed.scheme, parsed.hostname, parsed.port))
 
 
+class RetryPolicy(object):
+
+  """Policy for retrying requests after transient server failures.
+
+  :param attempts: Maximum number of attempts per request (including the
+    first one).
+  :param backoff: Delay in seconds before the first retry.
+  :param factor: Multiplier applied to the delay after each retry.
+  :param max_delay: Maximum delay in seconds between two attempts.
+  :param max_elapsed: Maximum time in seconds spent on a request. No retry
+    will be attempted if it would start after this much time.
+  :param statuses: HTTP status codes considered transient. Note that Azkaban
+    also uses 500 responses for some application errors (e.g. missing job
+    logs), so these aren't retried by default.
+  :param jitter: Randomize delays, to avoid clients retrying in lockstep.
+
+  Connection errors are always considered transient. If the server includes a
+  `Retry-After` header in its response, the next attempt won't happen before
+  the requested delay.
+
+  """
+
+  def __init__(self, attempts=3, backoff=0.5, factor=2, max_delay=30,
+    max_elapsed=60, statuses=(502, 503, 504), jitter=True):
+    self.attempts = attempts
+    self.backoff = backoff
+    self.factor = factor
+    self.max_delay = max_delay
+    self.max_elapsed = max_elapsed
+    self.statuses = frozenset(statuses)
+    self.jitter = jitter
+
+  def __repr__(self):
+    return '<%s(attempts=%s, max_elapsed=%s)>' % (
+      self.__class__.__name__, self.attempts, self.max_elapsed
+    )
+
+  def get_delay(self, attempt, elapsed, response=None):
+    """Get delay before the next attempt.
+
+    :param attempt: Number of attempts made so far.
+    :param elapsed: Time in seconds since the first attempt.
+    :param response: Response to the last attempt, if any.
+
+    Returns `None` if no further attempt should be made.
+
+    """
+    if attempt >= self.attempts:
+      return None
+    delay = min(self.max_delay, self.backoff * self.factor ** (attempt - 1))
+    if self.jitter:
+      delay = uniform(delay / 2., delay)
+    if response is not None:
+      retry_after = _parse_retry_after(response)
+      if retry_after is not None:
+        delay = max(delay, retry_after)
+    if elapsed + delay > self.max_elapsed:
+      return None
+    return delay
+
+
+class KeepalivePolicy(object):
+
+  """Policy for keeping a session's ID alive from a background thread.
+
+  :param interval: Time in seconds between two checks. An ID which wasn't
+    accepted by the server during this long is pinged with a cheap request, so
+    that the server doesn't expire it for inactivity.
+  :param max_age: Time in seconds after which IDs are refreshed pre-emptively
+    (e.g. slightly less than the server's session time to live). By default,
+    IDs are only refreshed once rejected by the server.
+
+  An ID's age is counted from when the session obtained it (the age of IDs
+  loaded from the configuration file is unknown, so it is counted from when
+  the session was instantiated).
+
+  """
+
+  def __init__(self, interval=60, max_age=None):
+    self.interval = interval
+    self.max_age = max_age
+
+  def __repr__(self):
+    return '<%s(interval=%s, max_age=%s)>' % (
+      self.__class__.__name__, self.interval, self.max_age
+    )
+
+  def get_action(self, age, idle):
+    """Get action to take on the session's current ID.
+
+    :param age: Time in seconds since the ID was obtained.
+    :param idle: Time in seconds since the ID was last accepted by the server,
+      `None` if it never was.
+
+    Returns `'refresh'`, `'ping'`, or `None` if the ID doesn't need anything.
+
+    """
+    if self.max_age is not None and age + self.interval > self.max_age:
+      # the ID would expire before the next check
+      return 'refresh'
+    if idle is None or idle >= self.interval:
+      return 'ping'
+    return None
+
+
 class Session(object):
 
   """Azkaban session.
@@ -116,6 +365,32 @@ class Session(object):
   :param config: Configuration object used to store session IDs.
   :param attempts: Maximum number of attempts to refresh session.
   :param verify: Whether or not to verify HTTPS requests.
+  :param pool_connections: Number of per-host connection pools to cache.
+  :param pool_maxsize: Maximum number of connections kept alive per host. This
+    also bounds how many requests can be in flight to the server at once
+    without opening throwaway connections.
+  :param max_retries: Number of retries on failed connection attempts (this
+    doesn't apply to requests which reached the server).
+  :param validity: Number of seconds during which a session ID accepted by the
+    server is trusted without being checked again.
+  :param cache: :class:`~azkaban.cache.MetadataCache` instance used to store
+    project IDs, flow lists and flow graphs. By default nothing is cached.
+  :param retry: :class:`RetryPolicy` used for transient failures (connection
+    errors and overloaded server responses). By default requests are only
+    attempted once. Requests which aren't idempotent (e.g. running a workflow)
+    are only retried if they certainly didn't reach the server, so they are
+    never submitted twice.
+  :param limiter: :class:`~azkaban.util.RateLimiter` used to throttle requests
+    to the server. Several sessions can share the same limiter.
+  :param log_cache: :class:`~azkaban.cache.LogCache` instance used by
+    :class:`Execution` log generators to store logs as they are fetched. Logs
+    of finished executions are then served from disk, and following running
+    ones resumes from the last fetched offset. By default nothing is cached.
+  :param keepalive: :class:`KeepalivePolicy` used to keep the session's ID
+    alive from a background thread (until :meth:`close` is called), so that
+    requests don't have to wait for a login after the ID expires. By default
+    IDs are only refreshed once rejected by the server. Refreshing in the
+    background requires the password to be included in the session's URL.
 
   This class contains mostly low-level methods that translate directly into
   Azkaban API calls. The :class:`~azkaban.remote.Execution` class should be
@@ -125,20 +400,43 @@ class Session(object):
   the :class:`Session` doesn't guarantee that its current ID (e.g. loaded from
   the configuration file) is valid.
 
+  Sessions can be shared between threads. When the ID expires, only one
+  thread logs in again: the others wait for the new ID and replay their
+  requests with it.
+
+  All requests emitted by a session reuse the same pool of keep-alive
+  connections. The pool is released by calling :meth:`close`, or automatically
+  when the session is used as a context manager:
+
+  .. code:: python
+
+    with Session.from_alias('foo') as session:
+      session.get_projects()
+
   """
 
   def __init__(
-    self, url=None, alias=None, config=None, attempts=3, verify=True
+    self, url=None, alias=None, config=None, attempts=3, verify=True,
+    pool_connections=10, pool_maxsize=10, max_retries=0, validity=300,
+    cache=None, retry=None, limiter=None, log_cache=None, keepalive=None
   ):
     self.attempts = attempts
     self.verify = verify
+    self.validity = validity
+    self.cache = cache
+    self.log_cache = log_cache
+    self.retry = retry
+    self.limiter = limiter
     self.config = config
+    self.pool_maxsize = pool_maxsize
+    self._client = _create_client(pool_connections, pool_maxsize, max_retries)
     if not url:
       warn(DeprecationWarning(
         'Session constructor support for aliases is going away in 1.0. '
         'Please use `Session.from_alias` instead.',
       ))
-      config = config or Config() # Temporary hack for backwards compatibility.
+      # Temporary hack for backwards compatibility.
+      config = config or Config.shared()
       alias = alias or config.get_option('azkaban', 'default.alias')
       try:
         url = config.parser.get('alias', alias)
@@ -147,15 +445,19 @@ class Session(object):
     self.user, self.password, self.url = _parse_url(url)
     if not self.user:
       self.user = getuser()
-    self.id = None
-    if self.config:
-      try:
-        key = str(self).replace(':', '.')
-        self.id = self.config.parser.get('session_id', key)
-      except (NoOptionError, NoSectionError):
-        pass
+    self.id = self._get_cached_id() if self.config else None
+    # last time the current ID was accepted (possibly by an earlier process)
+    self._validated = self._get_cached_validation() if self.id else None
+    self._issued = time() # time the current ID was obtained
+    self._refresh_lock = Lock()
     self._logger = Adapter(repr(self), _logger)
     self._logger.debug('Instantiated.')
+    self.keepalive = keepalive
+    self._closed = Event()
+    if keepalive:
+      thread = Thread(target=self._keep_alive)
+      thread.daemon = True
+      thread.start()
 
   def __repr__(self):
     return '<%s(url=\'%s@%s\')>' % (
@@ -165,38 +467,66 @@ class Session(object):
   def __str__(self):
     return '%s@%s' % (self.user, self.url)
 
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+  def close(self):
+    """Close all pooled connections.
+
+    The session can still be used afterwards, new connections will be opened
+    as needed. Its keepalive thread, if any, is stopped and its log cache's
+    index saved.
+
+    """
+    self._logger.debug('Closing connections.')
+    self._closed.set()
+    if self.log_cache is not None:
+      self.log_cache.flush()
+    self._client.close()
+
   def is_valid(self, response=None):
     """Check if the current session ID is valid.
 
     :param response: If passed, this reponse will be used to determine the
-      validity of the session. Otherwise a simple test request will be emitted.
+      validity of the session. Otherwise a simple test request will be emitted,
+      unless the ID was accepted by the server in the last `validity` seconds.
+
+    The result of test requests is also saved to the configuration (if any),
+    so that sessions created within the same window (e.g. by later command
+    invocations) don't check the ID again.
 
     """
     self._logger.debug('Checking if current session is valid.')
     if not self.id:
       self._logger.debug('No previous ID found.')
       return False
-    if response is None:
+    checked = response is None
+    if checked:
+      if self._validated and time() - self._validated < self.validity:
+        self._logger.debug('ID %s was recently validated.', self.id)
+        return True
       # issue a request to check if the ID is valid (note the explicit `None`
       # check as 500 responses are falsish).
       self._logger.debug('Checking if ID %s is valid.', self.id)
-      response = _azkaban_request(
+      response = self._emit(
         'POST',
         '%s/manager' % (self.url, ),
         data={'session.id': self.id},
-        verify=self.verify,
       )
       # the above request will return a 200 empty response if the current
       # session ID is valid and a 500 response otherwise
-    if (
-      '<!-- /.login -->' in response.text or # usual non API error response
-      'Login error' in response.text or # special case for API
-      '"error" : "session"' in response.text # error when running a flow's jobs
-    ):
+    if _is_session_error(response):
       self._logger.debug('ID %s is invalid:\n%s', self.id, response.text)
+      self._validated = None
       return False
     else:
       self._logger.debug('ID %s is valid.', self.id)
+      self._validated = time()
+      if checked and self.config:
+        self._save_validation()
       return True
 
   def get_workflow_executions(self, project, flow, start=0, length=10):
@@ -230,6 +560,61 @@ class Session(object):
     else:
       return _extract_json(res)
 
+  def iter_workflow_executions(self, project, flow, since=None, page_size=25,
+    prefetch=2):
+    """Iterate over all executions of a flow, newest first.
+
+    :param project: Project name.
+    :param flow: Flow name.
+    :param since: Timestamp in milliseconds (like the executions' own
+      `submitTime`). Iteration stops at the first execution submitted earlier
+      than this, without fetching any further pages.
+    :param page_size: Number of executions fetched per request.
+    :param prefetch: Number of pages fetched concurrently ahead of the one
+      being consumed. Set to 0 to fetch pages only when needed.
+
+    Executions submitted while iterating are skipped, and won't cause any
+    execution to be yielded twice.
+
+    """
+    self._logger.debug('Iterating over executions of %s/%s.', project, flow)
+
+    def _fetch(start):
+      """Fetch a single page."""
+      return self.get_workflow_executions(project, flow, start, page_size)
+
+    pool = ThreadPool(prefetch) if prefetch else None
+    pages = deque()
+    try:
+      page = _fetch(0)
+      total = page.get('total', 0)
+      start = page_size
+      last_id = None
+      while page and page['executions']:
+        # keep the next pages in flight while this one is being consumed
+        while pool and len(pages) < prefetch and start < total:
+          pages.append(pool.apply_async(_fetch, (start, )))
+          start += page_size
+        for execution in page['executions']:
+          if since is not None and execution['submitTime'] < since:
+            return
+          if last_id is None or execution['execId'] < last_id:
+            last_id = execution['execId']
+            yield execution
+        if pages:
+          page = pages.popleft().get()
+        elif start < total:
+          page = _fetch(start)
+          start += page_size
+        else:
+          page = None
+        if page:
+          # executions submitted meanwhile push older ones further back
+          total = page.get('total', total)
+    finally:
+      if pool:
+        pool.terminate()
+
   def get_running_workflows(self, project, flow):
     """Get running executions of a flow.
 
@@ -268,6 +653,161 @@ class Session(object):
       },
     ))
 
+  def get_execution_updates(self, exec_id, last_update_time):
+    """Get changes to the status of an execution.
+
+    :param exec_id: Execution ID.
+    :param last_update_time: Time (in milliseconds since the epoch, as found
+      in statuses' `updateTime` field) since when to get changes.
+
+    The response contains the execution's current status and times, along with
+    only the nodes updated since `last_update_time` (nested within their
+    embedded flow nodes if applicable). This is much smaller than the full
+    status of large flows.
+
+    """
+    self._logger.debug('Fetching updates for execution %s.', exec_id)
+    return _extract_json(self._request(
+      method='GET',
+      endpoint='executor',
+      params={
+        'execid': exec_id,
+        'ajax': 'fetchexecflowupdate',
+        'lastUpdateTime': last_update_time,
+      },
+    ))
+
+  def get_execution_statuses(self, exec_ids, max_concurrency=None):
+    """Get statuses of several executions concurrently.
+
+    :param exec_ids: Iterable of execution IDs.
+    :param max_concurrency: Maximum number of requests in flight. Defaults to
+      the size of the session's connection pool.
+
+    Returns a generator of `(exec_id, status, error)` tuples, yielded as each
+    request completes (i.e. not necessarily in the order of `exec_ids`). If a
+    fetch fails, `status` is `None` and `error` contains the exception, the
+    remaining executions are still fetched.
+
+    """
+    pool = ThreadPool(max_concurrency or self.pool_maxsize)
+    try:
+      for res in self._fetch_statuses(pool, exec_ids):
+        yield res
+    finally:
+      pool.terminate()
+
+  def _fetch_statuses(self, pool, exec_ids):
+    """Fetch statuses of several executions on a thread pool.
+
+    :param pool: `ThreadPool` used to run the requests.
+    :param exec_ids: Iterable of execution IDs.
+
+    Cf. :meth:`get_execution_statuses`.
+
+    """
+
+    def _fetch(exec_id):
+      """Fetch a single status, capturing any error."""
+      try:
+        return exec_id, self.get_execution_status(exec_id), None
+      except (AzkabanError, rq.RequestException, ValueError) as err:
+        self._logger.warning(
+          'Unable to fetch status for execution %s: %s', exec_id, err
+        )
+        return exec_id, None, err
+
+    return pool.imap_unordered(_fetch, exec_ids)
+
+  def wait_all(self, exec_ids, timeout=None, poll=5, min_poll=0.5,
+    backoff=1.5):
+    """Wait for several executions to finish.
+
+    :param exec_ids: Iterable of execution IDs.
+    :param timeout: Maximum time in seconds to wait. An error is raised if any
+      execution is still running after this long. Defaults to waiting forever.
+    :param poll: Maximum time in seconds between two status checks.
+    :param min_poll: Time in seconds before the first status check. The delay
+      then increases by a factor `backoff` each check until reaching `poll`.
+    :param backoff: Delay increase factor.
+
+    Returns a dictionary of final statuses keyed by execution ID. Statuses of
+    all pending executions are fetched concurrently at each check. Failed
+    checks are retried at the next one, they only cause an error if the
+    timeout is reached.
+
+    """
+    return dict(
+      self._wait(exec_ids, timeout, poll, min_poll, backoff)
+    )
+
+  def wait_any(self, exec_ids, timeout=None, poll=5, min_poll=0.5,
+    backoff=1.5):
+    """Wait for the first of several executions to finish.
+
+    :param exec_ids: Iterable of execution IDs.
+    :param timeout: Cf. :meth:`wait_all`.
+    :param poll: Cf. :meth:`wait_all`.
+    :param min_poll: Cf. :meth:`wait_all`.
+    :param backoff: Cf. :meth:`wait_all`.
+
+    Returns an `(exec_id, status)` tuple.
+
+    """
+    exec_ids = list(exec_ids)
+    if not exec_ids:
+      raise ValueError('No executions to wait for.')
+    return next(self._wait(exec_ids, timeout, poll, min_poll, backoff))
+
+  def _wait(self, exec_ids, timeout, poll, min_poll, backoff):
+    """Generator of statuses of executions as they finish.
+
+    :param exec_ids: Iterable of execution IDs.
+    :param timeout: Cf. :meth:`wait_all`.
+    :param poll: Cf. :meth:`wait_all`.
+    :param min_poll: Cf. :meth:`wait_all`.
+    :param backoff: Cf. :meth:`wait_all`.
+
+    """
+    pending = set(exec_ids)
+    deadline = None if timeout is None else time() + timeout
+    delay = min_poll
+    errors = {} # error of each execution whose last check failed
+    pool = ThreadPool(self.pool_maxsize) # reused by all checks
+    try:
+      while pending:
+        # the pool iterates over the IDs while statuses are yielded, so it
+        # gets its own copy and `pending` is only updated after the batch
+        finished = set()
+        for exec_id, status, err in self._fetch_statuses(pool, list(pending)):
+          if err:
+            errors[exec_id] = err # the execution will be checked again
+            continue
+          errors.pop(exec_id, None)
+          if status['status'] in _TERMINAL_STATUSES:
+            finished.add(exec_id)
+            yield exec_id, status
+        pending -= finished
+        if not pending:
+          break
+        if deadline is not None:
+          if time() >= deadline:
+            if errors:
+              exec_id = min(errors)
+              raise AzkabanError(
+                'Unable to check execution %s after %ss: %s',
+                exec_id, timeout, errors[exec_id]
+              )
+            raise AzkabanError(
+              'Executions still running after %ss: %s.',
+              timeout, ', '.join(str(exec_id) for exec_id in sorted(pending))
+            )
+          delay = min(delay, deadline - time())
+        sleep(max(0, delay))
+        delay = min(delay * backoff, poll)
+    finally:
+      pool.terminate()
+
   def get_execution_logs(self, exec_id, offset=0, limit=50000):
     """Get execution logs.
 
@@ -320,6 +860,7 @@ class Session(object):
     res = _extract_json(self._request(
       method='GET',
       endpoint='executor',
+      idempotent=False,
       params={
         'execid': exec_id,
         'ajax': 'cancelFlow',
@@ -348,15 +889,18 @@ class Session(object):
 
     """
     self._logger.debug('Creating project %s.', name)
-    return _extract_json(self._request(
+    res = _extract_json(self._request(
       method='POST',
       endpoint='manager',
+      idempotent=False,
       data={
         'action': 'create',
         'name': name,
         'description': description,
       },
     ))
+    self._invalidate(name)
+    return res
 
   def delete_project(self, name):
     """Delete a project on Azkaban.
@@ -368,6 +912,7 @@ class Session(object):
     res = self._request(
       method='GET',
       endpoint='manager',
+      idempotent=False,
       params={
         'project': name,
         'delete': 'true',
@@ -376,6 +921,7 @@ class Session(object):
     msg = "Project '%s' was successfully deleted" % (name, )
     if not msg in res.text:
       raise AzkabanError('Delete failed. Check permissions and existence.')
+    self._invalidate(name)
     return res
 
   def run_workflow(self, name, flow, jobs=None, disabled_jobs=None,
@@ -438,6 +984,7 @@ class Session(object):
       method='POST',
       endpoint='executor',
       include_session='params',
+      idempotent=False,
       data=request_data,
     ))
     self._logger.info('Started project %s workflow %s.', name, flow)
@@ -474,6 +1021,7 @@ class Session(object):
     res = _extract_json(self._request(
       method='POST',
       endpoint='schedule',
+      idempotent=False,
       data=request_data,
     ))
     self._logger.info('Scheduled project %s workflow %s.', name, flow)
@@ -494,6 +1042,7 @@ class Session(object):
     res = _extract_json(self._request(
       method='POST',
       endpoint='schedule',
+      idempotent=False,
       data=request_data,
     ))
     self._logger.info('Unscheduled project %s workflow %s.', name, flow)
@@ -521,6 +1070,7 @@ class Session(object):
     res = _extract_json(self._request(
       method='POST',
       endpoint='schedule',
+      idempotent=False,
       params=request_data,
     ))
     self._logger.info('Scheduled project %s workflow %s.', name, flow)
@@ -612,24 +1162,30 @@ class Session(object):
 
     """
     self._logger.debug('Retrieving id for project %s.', name)
-    try:
-      res = _extract_json(self._request(
-        method='GET',
-        endpoint='manager',
-        params={
-          # there is no endpoint to get the project id, getPermissions is
-          # the least expensive endpoint whose response contains the id
-          'ajax': 'getPermissions',
-          'project': name,
-        },
-      ))
-    except ValueError:
-      # Azkaban server sends a 200 empty response if the project doesn't exist
-      raise AzkabanError(
-        'Failed to get project id. Check that the project exists.'
-      )
-    else:
-      project_id = res['projectId']
+
+    def _fetch():
+      """Fetch id from the server."""
+      try:
+        res = _extract_json(self._request(
+          method='GET',
+          endpoint='manager',
+          params={
+            # there is no endpoint to get the project id, getPermissions is
+            # the least expensive endpoint whose response contains the id
+            'ajax': 'getPermissions',
+            'project': name,
+          },
+        ))
+      except ValueError:
+        # Azkaban server sends a 200 empty response if the project doesn't
+        # exist
+        raise AzkabanError(
+          'Failed to get project id. Check that the project exists.'
+        )
+      else:
+        return res['projectId']
+
+    project_id = self._cached(_fetch, name, 'id')
     self._logger.info('Retrieved id for project %s: %s.', name, project_id)
     return project_id
 
@@ -646,8 +1202,11 @@ class Session(object):
     self._logger.debug('Uploading archive %r to project %s.', path, name)
     if not exists(path):
       raise AzkabanError('Unable to find archive at %r.' % (path, ))
+    stale_id = self.id
     if not self.is_valid():
-      self._refresh() # ensure that the ID is valid
+      # ensure the ID is valid, unless it was recently checked (possibly by an
+      # earlier process, cf. `is_valid`)
+      self._renew(stale_id)
     archive_name = archive_name or basename(path)
     form = MultipartForm(
       files=[{
@@ -658,20 +1217,20 @@ class Session(object):
       params={
         'ajax': 'upload',
         'project': name,
-        'session.id': self.id,
       },
       callback=callback
     )
-    # note that we have made sure the ID is valid, for two reasons:
-    # + to avoid reuploading large files
-    # + to simplify the custom ID update process (form parameter)
+    # note that we have made sure the ID is valid to avoid reuploading large
+    # files, the form will only be streamed again if the ID expired meanwhile
     res = _extract_json(self._request(
       method='POST',
       endpoint='manager',
-      include_session=False,
+      include_session='form',
+      idempotent=False,
       headers=form.headers,
       data=form,
     ))
+    self._invalidate(name)
     self._logger.info(
       'Archive %s for project %s uploaded as %s.', path, name, archive_name
     )
@@ -686,22 +1245,27 @@ class Session(object):
     self._logger.debug(
       'Fetching workflows in project %s', name
     )
-    try:
-      res = self._request(
-        method='GET',
-        endpoint='manager',
-        params={
-          'ajax': 'fetchprojectflows',
-          'project': name,
-        },
-      )
-    except HTTPError:
-      raise AzkabanError('No workflows found in project %s', name)
-    else:
+
+    def _fetch():
+      """Fetch workflows from the server."""
       try:
-        return _extract_json(res)
-      except ValueError:
-        raise AzkabanError('Project %s not found', name)
+        res = self._request(
+          method='GET',
+          endpoint='manager',
+          params={
+            'ajax': 'fetchprojectflows',
+            'project': name,
+          },
+        )
+      except HTTPError:
+        raise AzkabanError('No workflows found in project %s', name)
+      else:
+        try:
+          return _extract_json(res)
+        except ValueError:
+          raise AzkabanError('Project %s not found', name)
+
+    return self._cached(_fetch, name, 'flows')
 
   def get_workflow_info(self, name, flow):
     """Get list of jobs corresponding to a workflow.
@@ -713,26 +1277,100 @@ class Session(object):
     self._logger.debug(
       'Fetching infos for workflow %s in project %s', flow, name
     )
-    try:
-      res = self._request(
-        method='GET',
-        endpoint='manager',
-        params={
-          'ajax': 'fetchflowjobs',
-          'project': name,
-          'flow': flow,
-        },
+
+    def _fetch():
+      """Fetch workflow graph from the server."""
+      try:
+        res = self._request(
+          method='GET',
+          endpoint='manager',
+          params={
+            'ajax': 'fetchflowjobs',
+            'project': name,
+            'flow': flow,
+          },
+        )
+      except HTTPError:
+        # the Azkaban server throws a NullPointerException if the flow doesn't
+        # exist in the project, which causes a 500 response
+        raise AzkabanError('Worklow %s not found in project %s.', flow, name)
+      else:
+        try:
+          return _extract_json(res)
+        except ValueError:
+          # but sends a 200 empty response if the project doesn't exist
+          raise AzkabanError('Project %s not found.', name)
+
+    return self._cached(_fetch, name, 'flow', flow)
+
+  def _renew(self, stale_id):
+    """Refresh session ID, unless another thread already replaced it.
+
+    :param stale_id: ID rejected by the server (or `None` if there was none).
+
+    Threads sharing the session which find its ID expired at the same time
+    will therefore only log in once: the first one refreshes the ID while the
+    others wait, then reuse it.
+
+    """
+    with self._refresh_lock:
+      if self.id != stale_id:
+        self._logger.debug('Using ID refreshed by another thread.')
+      else:
+        self._refresh()
+
+  def _keep_alive(self):
+    """Keep the session's ID alive until the session is closed.
+
+    This runs on a background thread, cf. :class:`KeepalivePolicy`.
+
+    """
+    policy = self.keepalive
+    self._logger.debug('Starting keepalive.')
+    while not self._closed.wait(policy.interval):
+      session_id = self.id
+      if not session_id:
+        continue # nothing to keep alive until a request logs in
+      now = time()
+      action = policy.get_action(
+        now - self._issued,
+        now - self._validated if self._validated else None,
       )
-    except HTTPError:
-      # the Azkaban server throws a NullPointerException if the flow doesn't
-      # exist in the project, which causes a 500 response
-      raise AzkabanError('Worklow %s not found in project %s.', flow, name)
-    else:
       try:
-        return _extract_json(res)
-      except ValueError:
-        # but sends a 200 empty response if the project doesn't exist
-        raise AzkabanError('Project %s not found.', name)
+        if action == 'refresh' and self.password:
+          self._logger.debug('Refreshing ID %s pre-emptively.', session_id)
+          self._renew(session_id)
+        elif action:
+          self._ping(session_id)
+      except (AzkabanError, rq.RequestException) as err:
+        self._logger.warning('Keepalive failed: %s', err)
+    self._logger.debug('Stopped keepalive.')
+
+  def _ping(self, session_id):
+    """Check an ID with a cheap request, refreshing it if it was rejected.
+
+    :param session_id: Session ID.
+
+    Unlike :meth:`is_valid`, this always emits a request (which also resets
+    the server's inactivity timeout). Rejected IDs are only refreshed if the
+    password is known, rather than prompting for it from the background.
+
+    """
+    response = self._emit(
+      'POST',
+      '%s/manager' % (self.url, ),
+      data={'session.id': session_id},
+    )
+    if not _is_session_error(response):
+      if self.id == session_id:
+        self._validated = time()
+    elif self.password:
+      self._logger.debug('ID %s expired, refreshing.', session_id)
+      self._renew(session_id)
+    else:
+      self._logger.debug(
+        'ID %s expired, leaving refresh to the next request.', session_id
+      )
 
   def _refresh(self, password=None):
     """Refresh session ID.
@@ -740,16 +1378,60 @@ class Session(object):
     :param password: Password used to log into Azkaban. If not specified,
       will prompt for one.
 
-    Also caches the session ID for future use.
+    Also caches the session ID for future use. When a configuration is
+    attached, the cache is locked during the refresh so that concurrent
+    processes log in only once: if another process refreshed the ID in the
+    meantime, its ID is reused rather than logging in again (unless the server
+    rejects it too).
 
     """
     self._logger.debug('Refreshing.')
+    if not self.config:
+      self.id = self._login(password)
+    else:
+      stale_id = self.id
+      with self.config.lock():
+        self.config.reload()
+        cached_id = self._get_cached_id()
+        if cached_id and cached_id != stale_id:
+          # the other process' ID might have expired as well (e.g. if the
+          # server was restarted), so we check it before adopting it
+          response = self._emit(
+            'POST',
+            '%s/manager' % (self.url, ),
+            data={'session.id': cached_id},
+          )
+          if not _is_session_error(response):
+            self._logger.info('Using ID refreshed by another process.')
+            self.id = cached_id
+            self._issued = self._validated = time()
+            return
+          self._logger.debug(
+            'ID %s cached by another process is invalid.', cached_id
+          )
+        self.id = self._login(password)
+        if not self.config.parser.has_section('session_id'):
+          self.config.parser.add_section('session_id')
+        self.config.parser.set('session_id', self._cache_key, self.id)
+        self.config.parser.set(
+          'session_id', self._validation_key, str(self._validated)
+        )
+        self.config.save()
+    self._issued = time()
+    self._logger.info('Refreshed.')
+
+  def _login(self, password=None):
+    """Log into Azkaban and return the new session ID.
+
+    :param password: Cf. :meth:`_refresh`.
+
+    """
     attempts = self.attempts
     password = password or self.password
     while True:
       password = password or getpass('Azkaban password for %s: ' % (self, ))
       try:
-        res = _extract_json(_azkaban_request(
+        res = _extract_json(self._emit(
           'POST',
           self.url,
           data={
@@ -757,10 +1439,9 @@ class Session(object):
             'username': self.user,
             'password': password,
           },
-          verify=self.verify,
         ))
       except AzkabanError as err:
-        if not 'Incorrect Login.' in err.message:
+        if not 'Incorrect Login.' in str(err):
           raise err
         self._logger.warning('Invalid login attempt.')
         attempts -= 1
@@ -769,17 +1450,73 @@ class Session(object):
           raise AzkabanError('Too many unsuccessful login attempts. Aborting.')
       else:
         break
-    self.id = res['session.id']
-    if self.config:
-      if not self.config.parser.has_section('session_id'):
-        self.config.parser.add_section('session_id')
-      self.config.parser.set(
-        'session_id',
-        str(self).replace(':', '.'),
-        self.id
-      )
-      self.config.save()
-    self._logger.info('Refreshed.')
+    self._validated = time()
+    return res['session.id']
+
+  @property
+  def _cache_key(self):
+    """Option name under which the session ID is cached."""
+    return str(self).replace(':', '.')
+
+  @property
+  def _validation_key(self):
+    """Option name under which the cached ID's validation time is stored."""
+    return '%s.validated' % (self._cache_key, )
+
+  def _get_cached_id(self):
+    """Get session ID cached in the configuration, if any."""
+    try:
+      return self.config.parser.get('session_id', self._cache_key)
+    except (NoOptionError, NoSectionError):
+      return None
+
+  def _get_cached_validation(self):
+    """Get last time the cached session ID was accepted, if known."""
+    try:
+      return self.config.parser.getfloat('session_id', self._validation_key)
+    except (NoOptionError, NoSectionError, ValueError):
+      return None
+
+  def _save_validation(self):
+    """Save the current ID's validation time to the configuration.
+
+    Nothing is saved if another process replaced the cached ID meanwhile.
+
+    """
+    with self.config.lock():
+      self.config.reload()
+      if self._get_cached_id() == self.id:
+        self.config.parser.set(
+          'session_id', self._validation_key, str(self._validated)
+        )
+        self.config.save()
+
+  def _cached(self, fetch, *key):
+    """Get metadata from the cache, fetching it on a miss.
+
+    :param fetch: Function called to fetch the value from the server.
+    :param \*key: Cache key, it will be prefixed by the server's URL.
+
+    """
+    if self.cache is None:
+      return fetch()
+    key = (self.url, ) + key
+    value = self.cache.get(key)
+    if value is None:
+      value = fetch()
+      self.cache.set(key, value)
+    else:
+      self._logger.debug('Using cached %s.', '/'.join(key[1:]))
+    return value
+
+  def _invalidate(self, name):
+    """Invalidate all cached metadata for a project.
+
+    :param name: Project name.
+
+    """
+    if self.cache is not None:
+      self.cache.invalidate(self.url, name)
 
   def _run_options(self, name, flow, jobs=None, disabled_jobs=None,
     concurrent=True, properties=None, on_failure='finish', notify_early=False,
@@ -854,13 +1591,37 @@ class Session(object):
       })
     return request_data
 
-  def _request(self, method, endpoint, include_session='cookies', **kwargs):
+  def _emit(self, method, url, **kwargs):
+    """Emit a raw request with this session's connection settings.
+
+    :param method: HTTP method.
+    :param url: Full URL.
+    :param kwargs: Keyword arguments passed to :func:`_azkaban_request`.
+
+    Note that this doesn't include the session ID.
+
+    """
+    return _azkaban_request(
+      method,
+      url,
+      verify=self.verify,
+      client=self._client,
+      retry=self.retry,
+      limiter=self.limiter,
+      **kwargs
+    )
+
+  def _request(self, method, endpoint, include_session='cookies',
+    idempotent=True, **kwargs):
     """Make a request to Azkaban using this session.
 
     :param method: HTTP method.
     :param endpoint: Server endpoint (e.g. manager).
     :param include_session: Where to include the `session_id` (possible values:
-      `'cookies'`, `'params'`, `False`).
+      `'cookies'`, `'params'`, `'form'`, `False`). `'form'` should be used when
+      the data is a :class:`~azkaban.util.MultipartForm`.
+    :param idempotent: Whether the request can safely be retried after it
+      reached the server (cf. :class:`RetryPolicy`).
     :param kwargs: Keyword arguments passed to :func:`_azkaban_request`.
 
     If the session expired, will prompt for a password to refresh.
@@ -870,27 +1631,38 @@ class Session(object):
 
     if not self.id:
       self._logger.debug('No ID found.')
-      self._refresh()
+      self._renew(None)
 
-    def _send_request():
+    def _send_request(session_id):
       """Try sending the request with the appropriate credentials."""
       if include_session == 'cookies':
-        kwargs.setdefault('cookies', {})['azkaban.browser.session.id'] = self.id
+        cookies = kwargs.setdefault('cookies', {})
+        cookies['azkaban.browser.session.id'] = session_id
       elif include_session == 'params':
-        kwargs.setdefault('data', {})['session.id'] = self.id
+        kwargs.setdefault('data', {})['session.id'] = session_id
+      elif include_session == 'form':
+        kwargs['data'].params['session.id'] = session_id
       elif include_session:
         raise ValueError('Invalid `include_session`: %r' % (include_session, ))
-      return _azkaban_request(method, full_url, verify=self.verify, **kwargs)
-
-    response = _send_request()
-    if not self.is_valid(response):
-      self._refresh()
-      response = _send_request()
-
-    # `_refresh` raises an exception rather than letting an unauthorized second
-    # request happen. this means that something is wrong with the server.
-    if not self.is_valid(response):
-      raise AzkabanError('Azkaban server is unavailable.')
+      response = self._emit(method, full_url, idempotent=idempotent, **kwargs)
+      if _is_session_error(response):
+        self._logger.debug('ID %s was rejected.', session_id)
+        return False, response
+      if self.id == session_id:
+        self._validated = time()
+      return True, response
+
+    session_id = self.id
+    valid, response = _send_request(session_id)
+    if not valid:
+      # only refresh when the server actually rejected the ID, and only once
+      # across threads (the ID might already have been refreshed by another)
+      self._renew(session_id)
+      valid, response = _send_request(self.id)
+      if not valid:
+        # `_refresh` raises an exception rather than letting an unauthorized
+        # request happen. this means that something is wrong with the server.
+        raise AzkabanError('Azkaban server is unavailable.')
 
     try:
       response.raise_for_status() # check that we get a 2XX response back
@@ -910,8 +1682,24 @@ class Session(object):
     :param alias: Alias name.
     :param config: Azkaban configuration object.
 
+    Besides its `url`, the alias' section can contain the following options:
+
+    * `verify`, `attempts`, `pool.connections`, `pool.maxsize`, `max.retries`
+      and `validity`, cf. the :class:`Session` arguments of the same name.
+    * `retry.attempts` and `retry.max.elapsed` (defaults to 60 seconds), to
+      retry transient failures (cf. :class:`RetryPolicy`).
+    * `rate.limit`, `rate.burst` and `rate.shared` (whether the limit applies
+      to all of the process' sessions to the same server), to throttle requests
+      (cf. :class:`~azkaban.util.RateLimiter`).
+    * `cache.ttl`, `cache.size` and `cache.path`, to cache metadata (cf.
+      :class:`~azkaban.cache.MetadataCache`).
+    * `log.cache.path` and `log.cache.size`, to cache logs (cf.
+      :class:`~azkaban.cache.LogCache`).
+    * `keepalive.interval` and `keepalive.max.age`, to keep the session's ID
+      alive (cf. :class:`KeepalivePolicy`).
+
     """
-    config = config or Config()
+    config = config or Config.shared()
     section_name = 'alias.%s' % (alias, )
     try:
       url = config.parser.get(section_name, 'url')
@@ -925,92 +1713,1094 @@ class Session(object):
         opts['verify'] = config.parser.getboolean(section_name, 'verify')
       if config.parser.has_option(section_name, 'attempts'):
         opts['attempts'] = config.parser.getint(section_name, 'attempts')
+      options = ['pool.connections', 'pool.maxsize', 'max.retries', 'validity']
+      for option in options:
+        if config.parser.has_option(section_name, option):
+          opts[option.replace('.', '_')] = config.parser.getint(
+            section_name, option
+          )
+      if config.parser.has_option(section_name, 'retry.attempts'):
+        opts['retry'] = RetryPolicy(
+          attempts=config.parser.getint(section_name, 'retry.attempts'),
+          max_elapsed=float(
+            config.get_option(section_name, 'retry.max.elapsed', '60')
+          ),
+        )
+      if config.parser.has_option(section_name, 'rate.limit'):
+        rate = float(config.parser.get(section_name, 'rate.limit'))
+        burst = float(config.get_option(section_name, 'rate.burst', '0'))
+        if (
+          config.parser.has_option(section_name, 'rate.shared') and
+          config.parser.getboolean(section_name, 'rate.shared')
+        ):
+          # shared by all sessions of this process talking to the server
+          opts['limiter'] = RateLimiter.shared(_parse_url(url)[2], rate, burst)
+        else:
+          opts['limiter'] = RateLimiter(rate, burst)
+      if config.parser.has_option(section_name, 'cache.ttl'):
+        opts['cache'] = MetadataCache(
+          ttl=config.parser.getint(section_name, 'cache.ttl'),
+          max_size=int(config.get_option(section_name, 'cache.size', '256')),
+          path=config.get_option(section_name, 'cache.path', '') or None,
+        )
+      if config.parser.has_option(section_name, 'keepalive.interval'):
+        max_age = config.get_option(section_name, 'keepalive.max.age', '')
+        opts['keepalive'] = KeepalivePolicy(
+          interval=float(config.parser.get(section_name, 'keepalive.interval')),
+          max_age=float(max_age) if max_age else None,
+        )
+      if config.parser.has_option(section_name, 'log.cache.path'):
+        opts['log_cache'] = LogCache(
+          path=config.parser.get(section_name, 'log.cache.path'),
+          max_size=int(
+            config.get_option(section_name, 'log.cache.size', str(1 << 30))
+          ),
+        )
     return Session(**opts)
 
 
-class Execution(object):
+def _iter_job_nodes(nodes, prefix='', flows=False):
+  """Iterate over the job nodes of an execution, including embedded ones.
 
-  """Remote workflow execution.
+  :param nodes: List of nodes, as found in an execution's status.
+  :param prefix: Prefix added to each job ID.
+  :param flows: Also yield embedded flow nodes, each before its own nodes.
 
-  :param session: :class:`Session` instance.
-  :param exec_id: Execution ID.
+  Yields `(job_id, node)` tuples, where the ID of jobs inside embedded flows is
+  prefixed by the IDs of their parent flow nodes (e.g. `'bar:foo'`), as
+  expected when fetching their logs.
 
   """
+  for node in nodes:
+    job_id = '%s%s' % (prefix, node['id'])
+    if 'nodes' in node:
+      if flows:
+        yield job_id, node
+      for job_node in _iter_job_nodes(
+        node['nodes'], '%s:' % (job_id, ), flows
+      ):
+        yield job_node
+    else:
+      yield job_id, node
 
-  def __init__(self, session, exec_id):
-    self._session = session
-    self.exec_id = exec_id
+def _merge_updates(status, updates):
+  """Apply changes to an execution's status.
 
-  @property
-  def status(self):
-    """Execution status."""
-    return self._session.get_execution_status(self.exec_id)
+  :param status: Execution status.
+  :param updates: Changes, as returned by
+    :meth:`Session.get_execution_updates`.
 
-  @property
-  def url(self):
-    """Execution URL."""
-    return '%s/executor?execid=%s' % (self._session.url, self.exec_id)
+  Returns the updated status, or `None` if the changes don't apply to this
+  status (e.g. they contain unknown nodes). The original status isn't modified:
+  only updated nodes and the lists containing them are copied. If nothing
+  changed, the original status itself is returned, so that anything derived
+  from it (e.g. its snapshot) can be reused.
 
-  def cancel(self):
-    """Cancel execution."""
-    self._session.cancel_execution(self.exec_id)
+  """
+  if not updates.get('nodes') and all(
+    key == 'nodes' or key in status and status[key] == value
+    for key, value in updates.items()
+  ):
+    return status
+  nodes = _merge_node_updates(status['nodes'], updates.get('nodes', []))
+  if nodes is None:
+    return None
+  merged = dict(status)
+  merged.update(updates)
+  merged['nodes'] = nodes
+  return merged
 
-  def logs(self, delay=5):
-    """Execution log generator.
+def _merge_node_updates(nodes, updates):
+  """Apply changes to a list of nodes.
 
-    :param delay: time in seconds between each server poll
+  :param nodes: List of nodes.
+  :param updates: List of updated nodes.
 
-    Yields line by line.
+  Returns `None` if any updated node isn't part of the list.
+
+  """
+  if not updates:
+    return nodes
+  positions = dict((node['id'], index) for index, node in enumerate(nodes))
+  nodes = list(nodes)
+  for update in updates:
+    index = positions.get(update['id'])
+    if index is None:
+      return None
+    node = nodes[index]
+    merged = dict(node)
+    merged.update(update)
+    if 'nodes' in update:
+      if not 'nodes' in node:
+        return None
+      merged['nodes'] = _merge_node_updates(node['nodes'], update['nodes'])
+      if merged['nodes'] is None:
+        return None
+    nodes[index] = merged
+  return nodes
+
+def _get_log_size(fetch):
+  """Find the current size of a log without downloading it.
+
+  :param fetch: Function taking an offset and limit as arguments and returning
+    the corresponding page of logs.
+
+  The size is bracketed by probing exponentially growing offsets, then found by
+  binary search, each probe only fetching a few bytes. Since the server only
+  returns whole characters, the result can be short by a few bytes when the log
+  ends with a multi-byte character.
+
+  """
+  def _exceeds(size):
+    """Whether the log contains at least `size` bytes."""
+    # a probe starting inside a character skips up to 3 continuation bytes
+    # before the next character, which has up to 4 bytes: 8 bytes guarantee it
+    # fits, so that only the log's last character can be missed
+    return fetch(size - 1, 8)['length'] > 0
+
+  low = 0 # largest size known to be reached
+  high = 1 << 10
+  while _exceeds(high):
+    low = high
+    high *= 2
+  while high - low > 1:
+    middle = (low + high) // 2
+    if _exceeds(middle):
+      low = middle
+    else:
+      high = middle
+  return low
+
+def _get_log_path(job):
+  """Get the path of a job's log in an export, relative to its directory.
+
+  :param job: Job ID (IDs of jobs in embedded flows are prefixed by the flows'
+    IDs, separated by colons).
+
+  Logs are saved under `jobs/`, so that they can't collide with the
+  execution's files. An error is raised if any part of the ID couldn't be
+  used as a file name without escaping this directory.
+
+  """
+  parts = job.split(':')
+  for part in parts:
+    if (
+      part in ('', '.', '..') or
+      '/' in part or
+      os.sep in part or
+      (os.altsep and os.altsep in part)
+    ):
+      raise AzkabanError('Invalid job name for a log file: %r.', job)
+  return '%s.log' % (join('jobs', *parts), )
+
+def _read_log_tail(fetch, lines, window=1 << 16):
+  """Read the last lines of a log, fetching it backwards.
+
+  :param fetch: Cf. :func:`_get_log_size`.
+  :param lines: Number of lines.
+  :param window: Size of the first page fetched from the end of the log. Each
+    earlier page is twice as large as the next, until enough lines are found.
+
+  """
+  pages = []
+  newlines = 0
+  end = _get_log_size(fetch)
+  slack = 4 # allow for a trailing character missed when probing the size
+  while end > 0 and newlines <= lines:
+    start = max(0, end - window)
+    window *= 2
+    logs = fetch(start, end - start + slack)
+    if not logs['length']:
+      if not start:
+        break
+      # the page fell inside a single (multi-byte) character, the next larger
+      # one will include it
+      continue
+    slack = 0
+    pages.append(logs['data'])
+    newlines += logs['data'].count('\n')
+    end = logs['offset']
+  contents = ''.join(reversed(pages))
+  if not contents:
+    return []
+  if contents.endswith('\n'):
+    contents = contents[:-1]
+  tail = contents.split('\n')
+  if end > 0:
+    tail = tail[1:] # first line is incomplete
+  return tail[-lines:] if lines else []
+
+def _read_log_range(fetch, start, end=None, limit=1 << 20):
+  """Read part of a log.
+
+  :param fetch: Cf. :func:`_get_log_size`.
+  :param start: Offset to start reading from.
+  :param end: Offset to stop reading at. Defaults to the current end of the
+    log.
+  :param limit: Maximum size of each page fetched.
+
+  Returns a generator of chunks of data.
+
+  """
+  offset = start
+  while end is None or offset < end:
+    size = limit if end is None else min(limit, end - offset)
+    logs = fetch(offset, size)
+    if not logs['length']:
+      break
+    offset += logs['length']
+    yield logs['data']
+
+
+class _LogFilter(object):
+
+  """Filter of logs, matching whole pages at once.
+
+  :param pattern: Regular expression (string or compiled), matched against
+    each line (`^` and `$` match at line boundaries).
+  :param max_count: Stop after this many matching lines.
+  :param context: Number of lines kept before and after each match. When
+    positive, non-contiguous groups of lines are separated by a `--` line.
+
+  Pages are searched with a single call per match rather than line by line;
+  only matching lines and their context are extracted.
+
+  """
+
+  def __init__(self, pattern, max_count=None, context=0):
+    if isinstance(pattern, string_types):
+      pattern = re.compile(pattern, re.M)
+    self.pattern = pattern
+    self.max_count = max_count
+    self.context = context
+    self.count = 0
+    self._after = 0 # lines remaining to be kept after the last match
+    self._before = deque(maxlen=context) # last lines skipped
+    self._skipped = False # whether lines were dropped since the last output
+    self._output = False
+    self._fragment = ''
+
+  @property
+  def done(self):
+    """Whether no further lines can be returned."""
+    return (
+      self.max_count is not None and
+      self.count >= self.max_count and
+      not self._after
+    )
+
+  def feed(self, data):
+    """Filter a page of logs, returning the list of lines kept.
+
+    :param data: Page data.
+
+    """
+    data = self._fragment + data
+    end = data.rfind('\n') + 1
+    self._fragment = data[end:]
+    return self._filter(data[:end])
+
+  def close(self):
+    """Filter the log's last line, if it doesn't end with a newline."""
+    data = self._fragment
+    self._fragment = ''
+    return self._filter('%s\n' % (data, )) if data else []
+
+  def _filter(self, data):
+    """Filter complete lines.
+
+    :param data: Lines, each terminated by a newline.
 
     """
-    finishing = False
-    offset = 0
+    lines = []
+    pos = 0
+    while pos < len(data) and not self.done:
+      match = None
+      if self.max_count is None or self.count < self.max_count:
+        match = self.pattern.search(data, pos)
+        if match and match.start() == len(data):
+          match = None # empty match after the last line
+      if not match:
+        self._skip(data[pos:], lines)
+        break
+      start = data.rfind('\n', pos, match.start()) + 1 or pos
+      end = data.find('\n', match.start())
+      if match.end() > end and not self.pattern.search(data, start, end):
+        # the match spans lines (e.g. a negated class matched a newline), the
+        # line only matches if the pattern matches it on its own
+        self._skip(data[pos:end + 1], lines)
+        pos = end + 1
+        continue
+      self._skip(data[pos:start], lines)
+      if self._skipped and self._output and self.context:
+        lines.append('--')
+      lines.extend(self._before)
+      lines.append(data[start:end])
+      self._before.clear()
+      self._skipped = False
+      self._output = True
+      self._after = self.context
+      self.count += 1
+      pos = end + 1
+    return lines
+
+  def _skip(self, data, lines):
+    """Process lines not matching, keeping any context.
+
+    :param data: Lines, each terminated by a newline.
+    :param lines: List where context lines following a match are added.
+
+    """
+    count = data.count('\n')
+    if not count:
+      return
+    after = min(self._after, count)
+    if after:
+      lines.extend(data.split('\n', after)[:after])
+      self._after -= after
+      count -= after
+    if count:
+      kept = min(count, self.context)
+      if len(self._before) + count > self.context:
+        self._skipped = True
+      if kept:
+        self._before.extend(data.rsplit('\n', kept + 1)[-kept - 1:-1])
+
+def _grep_logs(chunks, pattern, max_count=None, context=0):
+  """Filter raw log chunks, stopping early once enough lines are found.
+
+  :param chunks: Generator of log pages (e.g. from a raw log generator).
+  :param pattern: Cf. :class:`_LogFilter`.
+  :param max_count: Cf. :class:`_LogFilter`.
+  :param context: Cf. :class:`_LogFilter`.
+
+  """
+  log_filter = _LogFilter(pattern, max_count, context)
+  try:
+    for chunk in chunks:
+      for line in log_filter.feed(chunk):
+        yield line
+      if log_filter.done:
+        return # no need to fetch further pages
+    for line in log_filter.close():
+      yield line
+  finally:
+    chunks.close()
+
+def _replay_logs(session, exec_id, tail, job=None):
+  """Lines of a log stored in a session's log cache, if any.
+
+  :param session: :class:`Session` instance.
+  :param exec_id: Execution ID.
+  :param tail: :class:`_LogTail` instance, positioned after the cached data.
+  :param job: Job name, `None` for the execution's logs.
+
+  """
+  if session.log_cache is not None:
+    key = (session.url, str(exec_id), job or '')
+    state = session.log_cache.get(key)
+    if state:
+      _logger.debug('Replaying cached logs %r.', key)
+      for line in tail.replay(session.log_cache.read(key), *state):
+        yield line
+
+def _consume_logs(session, exec_id, tail, logs, job=None):
+  """Process a page of logs, storing it in a session's log cache, if any.
+
+  :param session: :class:`Session` instance.
+  :param exec_id: Execution ID.
+  :param tail: :class:`_LogTail` instance.
+  :param logs: Page, as returned by the server.
+  :param job: Job name, `None` for the execution's logs.
+
+  """
+  offset = tail.offset
+  lines = tail.consume(logs)
+  if session.log_cache is not None:
+    session.log_cache.update(
+      (session.url, str(exec_id), job or ''),
+      logs['data'], offset, tail.offset, tail.complete,
+    )
+  return lines
+
+
+def _report_job_status(tail, snapshot, job):
+  """Report a job's status to the tail following its log.
+
+  :param tail: :class:`_LogTail` instance.
+  :param snapshot: :class:`ExecutionSnapshot` of the job's execution.
+  :param job: Job name.
+
+  Jobs missing from the snapshot (e.g. not yet listed, or misspelled) are
+  considered pending until the execution is over, and their log is then never
+  marked complete.
+
+  """
+  job_status = snapshot.get_status(job)
+  if job_status is None:
+    tail.set_running(not snapshot.finished, known=False)
+  else:
+    tail.set_running(not job_status in _TERMINAL_STATUSES)
+
+
+class _LogTail(object):
+
+  """State of a followed log, shared by all log generators.
+
+  :param min_delay: Poll delay while new logs keep arriving.
+  :param max_delay: Maximum poll delay, reached when no new logs are found.
+  :param backoff: Factor by which the delay increases after each poll without
+    new logs.
+  :param limit: Initial page size.
+  :param max_limit: Maximum page size.
+  :param raw: Return each page's data as is rather than splitting it in lines.
+
+  Generators alternate between fetching `limit` bytes at `offset` and sleeping
+  `delay` seconds, stopping once `done` is set (`complete` is then also set if
+  the whole log was read, rather than following it stopped for lack of a known
+  status). When `status_due` is set, they should check whether the execution
+  (or job) is still running and report it via :meth:`set_running`. Status checks happen after polls without new logs,
+  or when a full page hints at a backlog, and at most once per `max_delay`
+  seconds.
+
+  Full pages are followed by another fetch without delay. Once the execution
+  is known to be over, the log is read back to back with a page size doubling
+  up to `max_limit` (live logs keep small pages).
+
+  Lines cut by a page boundary are reassembled: only complete lines are
+  returned, the trailing fragment of a page is carried over to the next one
+  (and returned on its own once the log is done).
+
+  """
+
+  def __init__(self, min_delay, max_delay, backoff, limit=50000,
+    max_limit=1 << 22, raw=False):
+    self.min_delay = min(min_delay, max_delay)
+    self.max_delay = max_delay
+    self.backoff = backoff
+    self.limit = limit
+    self.max_limit = max(limit, max_limit)
+    self.raw = raw
+    self.offset = 0
+    self.delay = self.min_delay
+    self.status_due = False
+    self.done = False
+    self.complete = False
+    self._finishing = False
+    self._known = True # whether the last reported status was known
+    self._checked = None # time of last status check
+    self._fragment = '' # incomplete last line of the previous page
+
+  def consume(self, logs):
+    """Process a page of logs, returning the list of lines it contains.
+
+    In raw mode, the list contains the page's data instead.
+
+    :param logs: Page, as returned by the server.
+
+    """
+    self.status_due = False
+    length = logs['length']
+    if length:
+      self.offset += length
+      if length < self.limit:
+        self.delay = 0 if self._finishing else self.min_delay
+      else:
+        self.delay = 0
+        if self._finishing:
+          self.limit = min(2 * self.limit, self.max_limit)
+        else:
+          self._check_status() # catch up faster if the execution is over
+      return self._split(logs['data'])
+    if self._finishing:
+      self.done = True
+      self.complete = self._known
+      if self._fragment:
+        return [self._fragment]
+    else:
+      self._check_status()
+      self.delay = min(self.max_delay, self.delay * self.backoff)
+    return []
+
+  def replay(self, chunks, offset, complete):
+    """Process logs fetched previously, returning the lines they contain.
+
+    :param chunks: Iterable of data, e.g. read from a
+      :class:`~azkaban.cache.LogCache`.
+    :param offset: Offset the data ends at, where fetching will resume.
+    :param complete: Whether the log is over, in which case nothing more needs
+      to be fetched.
+
+    """
+    for chunk in chunks:
+      for line in self._split(chunk):
+        yield line
+    self.offset = offset
+    if complete:
+      self.done = True
+      self.complete = True
+      if self._fragment:
+        yield self._fragment
+
+  def set_running(self, running, known=True):
+    """Report the status of the execution (or job) being followed.
+
+    :param running: Whether it is still running.
+    :param known: Whether its status is known. A log whose status is unknown
+      (e.g. a job missing from its execution's status) is still read to its
+      current end once it isn't running, but isn't considered complete.
+
+    """
+    if not running:
+      # read any remaining logs without waiting
+      self._finishing = True
+      self._known = known
+      self.delay = 0
+
+  def _split(self, data):
+    """Split data into complete lines, keeping track of the last fragment.
+
+    :param data: Page data.
+
+    """
+    if self.raw:
+      return [data]
+    lines = data.split('\n')
+    if self._fragment:
+      lines[0] = self._fragment + lines[0]
+    self._fragment = lines.pop()
+    return lines
+
+  def _check_status(self):
+    """Request a status check, unless one happened recently."""
+    now = time()
+    if self._checked is None or now - self._checked >= self.max_delay:
+      self._checked = now
+      self.status_due = True
+
+
+class ExecutionNode(namedtuple('ExecutionNode', [
+  'id', 'status', 'type', 'start_time', 'end_time', 'update_time',
+])):
+
+  """Job (or embedded flow) of an :class:`ExecutionSnapshot`.
+
+  Its `id` is prefixed by the IDs of any embedded flows containing it (e.g.
+  `'bar:foo'`). Times are in milliseconds since the epoch (-1 if not set).
+
+  """
+
+  __slots__ = ()
+
+
+class ExecutionEvent(namedtuple('ExecutionEvent', [
+  'job', 'old_status', 'new_status', 'start_time', 'end_time', 'update_time',
+])):
+
+  """Status transition of an execution or one of its jobs.
+
+  `job` is `None` for transitions of the execution itself, `old_status` is
+  `None` for jobs which weren't part of the previous snapshot. Times are those
+  of the job (or execution) after the transition.
+
+  """
+
+  __slots__ = ()
+
+
+class ExecutionSnapshot(object):
+
+  """Indexed view of an execution's status.
+
+  :param status: Execution status, as returned by
+    :meth:`Session.get_execution_status`.
+
+  Jobs (including those of embedded flows) and embedded flows themselves are
+  stored as compact :class:`ExecutionNode` records, indexed by ID and (jobs
+  only) by status:
+
+  .. code:: python
+
+    snapshot = execution.snapshot
+    snapshot['bar'].status # lookup of embedded flow bar
+    snapshot['bar:foo'].status # lookup of job foo in embedded flow bar
+    snapshot.get_jobs('RUNNING', 'PREPARING') # IDs of jobs with these statuses
+
+  """
+
+  __slots__ = (
+    'exec_id', 'flow', 'status', 'start_time', 'end_time', 'update_time',
+    '_nodes', '_jobs', '_statuses',
+  )
+
+  def __init__(self, status):
+    self.exec_id = status.get('execid')
+    self.flow = status.get('flowId', status.get('flow'))
+    self.status = status['status']
+    self.start_time = status.get('startTime', -1)
+    self.end_time = status.get('endTime', -1)
+    self.update_time = status.get('updateTime', -1)
+    nodes = []
+    statuses = {}
+    for job_id, node in _iter_job_nodes(status['nodes'], flows=True):
+      nodes.append(ExecutionNode(
+        job_id,
+        node['status'],
+        node.get('type'),
+        node.get('startTime', -1),
+        node.get('endTime', -1),
+        node.get('updateTime', -1),
+      ))
+      if not 'nodes' in node:
+        statuses.setdefault(node['status'], []).append(job_id)
+    self._nodes = tuple(nodes)
+    self._jobs = dict((node.id, node) for node in nodes)
+    self._statuses = dict(
+      (job_status, tuple(job_ids)) for job_status, job_ids in statuses.items()
+    )
+
+  def __repr__(self):
+    return '<%s(exec_id=%r, status=%r, jobs=%s)>' % (
+      self.__class__.__name__, self.exec_id, self.status, len(self._nodes)
+    )
+
+  def __len__(self):
+    return len(self._nodes)
+
+  def __iter__(self):
+    return iter(self._nodes)
+
+  def __contains__(self, job):
+    return job in self._jobs
+
+  def __getitem__(self, job):
+    return self._jobs[job]
+
+  @property
+  def finished(self):
+    """Whether the execution is over."""
+    return self.status in _TERMINAL_STATUSES
+
+  def get(self, job, default=None):
+    """Get a job's node.
+
+    :param job: Job ID (or embedded flow ID).
+    :param default: Value returned if the job isn't part of the execution.
+
+    """
+    return self._jobs.get(job, default)
+
+  def get_status(self, job):
+    """Get a job's status, `None` if the job isn't part of the execution.
+
+    :param job: Job ID.
+
+    """
+    node = self._jobs.get(job)
+    return node.status if node else None
+
+  def get_jobs(self, *statuses):
+    """Get IDs of jobs with any of the given statuses.
+
+    :param \*statuses: Job statuses.
+
+    Returns a tuple of job IDs, grouped by status in the order given. Embedded
+    flows aren't included.
+
+    """
+    if len(statuses) == 1:
+      return self._statuses.get(statuses[0], ())
+    return tuple(
+      job_id
+      for job_status in statuses
+      for job_id in self._statuses.get(job_status, ())
+    )
+
+  def get_transitions(self, previous):
+    """Get status transitions from a previous snapshot to this one.
+
+    :param previous: :class:`ExecutionSnapshot` of the same execution.
+
+    Returns a list of :class:`ExecutionEvent`, the execution's own transition
+    (if any) coming last.
+
+    """
+    events = []
+    previous_jobs = previous._jobs
+    for node in self._nodes:
+      previous_node = previous_jobs.get(node.id)
+      if previous_node is None or previous_node.status != node.status:
+        events.append(ExecutionEvent(
+          node.id,
+          previous_node.status if previous_node else None,
+          node.status,
+          node.start_time,
+          node.end_time,
+          node.update_time,
+        ))
+    if previous.status != self.status:
+      events.append(ExecutionEvent(
+        None,
+        previous.status,
+        self.status,
+        self.start_time,
+        self.end_time,
+        self.update_time,
+      ))
+    return events
+
+
+class ExecutionMonitor(object):
+
+  """Shared poller of an execution's status.
+
+  :param session: :class:`Session` instance.
+  :param exec_id: Execution ID.
+  :param interval: Default maximum age in seconds of the snapshot returned by
+    :meth:`poll`, also used as delay between polls when notifying subscribers.
+  :param incremental: Only fetch changes to the status after the first poll
+    (cf. :meth:`Session.get_execution_updates`), merging them into the
+    previous snapshot. Full statuses are fetched again if changes can't be
+    merged or the server doesn't support them.
+
+  Status requests are made at most once per interval regardless of how many
+  consumers (log tails, waiters, etc.) are interested in the status, including
+  across threads: concurrent callers wait for the same request to complete.
+  Subscribers are notified of each new snapshot, from a background thread which
+  runs while any are registered and the execution isn't over.
+
+  """
+
+  def __init__(self, session, exec_id, interval=5, incremental=True):
+    self.exec_id = exec_id
+    self.interval = interval
+    self.incremental = incremental
+    self._session = session
+    self._snapshot = None
+    self._parsed = None # (status, snapshot), cf. `snapshot`
+    self._history = deque(maxlen=16) # [previous, snapshot, transitions]
+    self._fetched = None
+    self._lock = Lock()
+    self._subscribers = []
+    self._thread = None
+
+  def poll(self, max_age=None):
+    """Get the execution's status, fetching it if necessary.
+
+    :param max_age: Maximum age in seconds of the returned status. If the last
+      fetched status is older, a new one will be fetched. Defaults to the
+      monitor's interval.
+
+    The returned status is shared with all the monitor's other users (and
+    later statuses share unchanged nodes with it), it must not be modified.
+
+    """
+    if max_age is None:
+      max_age = self.interval
+    callbacks = []
+    with self._lock:
+      if self._fetched is None or time() - self._fetched >= max_age:
+        self._snapshot = self._fetch()
+        self._fetched = time()
+        callbacks = list(self._subscribers)
+      status = self._snapshot
+    # subscribers are notified outside of the lock, so that they can use the
+    # monitor themselves
+    for callback in callbacks:
+      try:
+        callback(status)
+      except Exception: # don't let one subscriber break the others
+        _logger.exception('Execution %s subscriber failed.', self.exec_id)
+    return status
+
+  def snapshot(self, max_age=None):
+    """Get the execution's status as an :class:`ExecutionSnapshot`.
+
+    :param max_age: Cf. :meth:`poll`.
+
+    Each status is only parsed once, however many consumers request it.
+
+    """
+    self.poll(max_age)
+    with self._lock:
+      # another thread may have fetched a newer status since our poll, always
+      # parse the latest one so that snapshots never go back in time
+      status = self._snapshot
+      if not self._parsed or self._parsed[0] is not status:
+        snapshot = ExecutionSnapshot(status)
+        if self._parsed:
+          # transitions are only computed if requested, cf. `get_transitions`
+          self._history.append([self._parsed[1], snapshot, None])
+        self._parsed = (status, snapshot)
+      return self._parsed[1]
+
+  def get_transitions(self, since, max_age=None):
+    """Get the execution's status transitions since a previous snapshot.
+
+    :param since: :class:`ExecutionSnapshot` previously returned by this
+      monitor.
+    :param max_age: Cf. :meth:`poll`.
+
+    Returns a tuple `(snapshot, events)` where `snapshot` is the latest
+    :class:`ExecutionSnapshot` and `events` the list of
+    :class:`ExecutionEvent` which led to it. Transitions between consecutive
+    snapshots are computed once and shared by all consumers.
+
+    """
+    snapshot = self.snapshot(max_age)
+    if since is snapshot:
+      return snapshot, []
+    with self._lock:
+      steps = []
+      for step in reversed(self._history):
+        steps.append(step)
+        if step[0] is since:
+          break
+      else: # too old, compare directly
+        return snapshot, snapshot.get_transitions(since)
+      events = []
+      for step in reversed(steps):
+        if step[2] is None:
+          step[2] = step[1].get_transitions(step[0])
+        events.extend(step[2])
+      return snapshot, events
+
+  def _fetch(self):
+    """Fetch the execution's status, incrementally if possible."""
+    snapshot = self._snapshot
+    if self.incremental and snapshot and 'updateTime' in snapshot:
+      try:
+        updates = self._session.get_execution_updates(
+          self.exec_id, snapshot['updateTime']
+        )
+      except AzkabanError as err:
+        _logger.info('Disabling incremental status updates: %s', err)
+        self.incremental = False
+      except HTTPError as err:
+        _logger.debug('Unable to fetch status updates: %s', err)
+      else:
+        status = _merge_updates(snapshot, updates)
+        if status is not None:
+          return status
+        _logger.debug('Execution %s updates out of sync.', self.exec_id)
+    return self._session.get_execution_status(self.exec_id)
+
+  def subscribe(self, callback):
+    """Register a function to be called with each new status.
+
+    :param callback: Function taking the status as single argument. It is
+      called from the thread fetching the status, so should return quickly.
+
+    Polling starts in the background if it wasn't already running, and stops
+    once the execution is over or no subscribers are left.
+
+    """
+    with self._lock:
+      self._subscribers.append(callback)
+      if not self._thread:
+        self._thread = Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+  def unsubscribe(self, callback):
+    """Unregister a function previously passed to :meth:`subscribe`.
+
+    :param callback: Function.
+
+    """
+    with self._lock:
+      self._subscribers.remove(callback)
+
+  def _run(self):
+    """Background polling loop, notifying subscribers."""
     while True:
+      with self._lock:
+        if not self._subscribers:
+          self._thread = None
+          return
+      try:
+        status = self.poll(self.interval)
+      except (AzkabanError, HTTPError) as err:
+        _logger.warning('Unable to poll execution %s: %s', self.exec_id, err)
+      else:
+        if status['status'] in _TERMINAL_STATUSES:
+          with self._lock:
+            self._thread = None
+          return
+      if self._fetched is None:
+        sleep(self.interval)
+      else:
+        sleep(max(0, self._fetched + self.interval - time()))
+
+
+class Execution(object):
+
+  """Remote workflow execution.
+
+  :param session: :class:`Session` instance.
+  :param exec_id: Execution ID.
+
+  Statuses are fetched through the execution's :attr:`monitor`, so that
+  concurrent log generators share its requests.
+
+  """
+
+  def __init__(self, session, exec_id):
+    self._session = session
+    self.exec_id = exec_id
+    self.monitor = ExecutionMonitor(session, exec_id)
+
+  @property
+  def status(self):
+    """Execution status (always up to date).
+
+    The status is shared with the execution's :attr:`monitor`, it must not be
+    modified (cf. :meth:`ExecutionMonitor.poll`).
+
+    """
+    return self.monitor.poll(0)
+
+  @property
+  def snapshot(self):
+    """Execution status as :class:`ExecutionSnapshot` (always up to date)."""
+    return self.monitor.snapshot(0)
+
+  @property
+  def url(self):
+    """Execution URL."""
+    return '%s/executor?execid=%s' % (self._session.url, self.exec_id)
+
+  def cancel(self):
+    """Cancel execution."""
+    self._session.cancel_execution(self.exec_id)
+
+  def events(self, delay=5):
+    """Execution status transition generator.
+
+    :param delay: time in seconds between each status check (statuses are
+      shared with any other consumers of the execution's :attr:`monitor`)
+
+    Yields an :class:`ExecutionEvent` each time a job (or the execution)
+    changes status, until the execution is over.
+
+    """
+    snapshot = self.monitor.snapshot(0)
+    while not snapshot.finished:
+      sleep(delay)
+      snapshot, events = self.monitor.get_transitions(snapshot, delay)
+      for event in events:
+        yield event
+
+  def wait(self, timeout=None, poll=5, min_poll=0.5, backoff=1.5):
+    """Wait for the execution to finish.
+
+    :param timeout: Maximum time in seconds to wait. An error is raised if the
+      execution is still running after this long. Defaults to waiting forever.
+    :param poll: Maximum time in seconds between two status checks.
+    :param min_poll: Time in seconds before the first status check. The delay
+      then increases by a factor `backoff` each check until reaching `poll`,
+      so that short executions are detected quickly without polling long ones
+      too often.
+    :param backoff: Delay increase factor.
+
+    Returns the execution's final status (shared, cf. :attr:`status`).
+
+    """
+    deadline = None if timeout is None else time() + timeout
+    delay = min_poll
+    status = self.monitor.poll(0)
+    while not status['status'] in _TERMINAL_STATUSES:
+      if deadline is not None:
+        if time() >= deadline:
+          raise AzkabanError(
+            'Execution %s still running after %ss.', self.exec_id, timeout
+          )
+        delay = min(delay, deadline - time())
+      sleep(max(0, delay))
+      status = self.monitor.poll(delay)
+      delay = min(delay * backoff, poll)
+    return status
+
+  def logs(self, delay=5, min_delay=0.5, backoff=2, max_limit=1 << 22,
+    raw=False):
+    """Execution log generator.
+
+    :param delay: maximum time in seconds between each server poll, reached
+      when no new logs are found
+    :param min_delay: time in seconds between each server poll while new logs
+      keep arriving
+    :param backoff: factor by which the poll delay increases each time no new
+      logs are found
+    :param max_limit: maximum size in bytes of each page of logs fetched once
+      the execution has finished
+    :param raw: yield chunks of logs as they are fetched rather than lines
+
+    Yields line by line (including empty lines, and lines cut across pages).
+
+    """
+    tail = _LogTail(min_delay, delay, backoff, max_limit=max_limit, raw=raw)
+    for line in _replay_logs(self._session, self.exec_id, tail):
+      yield line
+    while not tail.done:
       logs = self._session.get_execution_logs(
         exec_id=self.exec_id,
-        offset=offset,
+        offset=tail.offset,
+        limit=tail.limit,
       )
-      if logs['length']:
-        offset += logs['length']
-        lines = (e for e in logs['data'].split('\n') if e)
-        for line in lines:
-          yield line
-      elif finishing:
+      for line in _consume_logs(self._session, self.exec_id, tail, logs):
+        yield line
+      if tail.done:
         break
-      else:
-        if self.status['status'] != 'RUNNING':
-          finishing = True
-      sleep(delay)
+      if tail.status_due:
+        tail.set_running(
+          not self.monitor.poll(delay)['status'] in _TERMINAL_STATUSES
+        )
+      sleep(tail.delay)
 
-  def job_logs(self, job, delay=5):
+  def job_logs(self, job, delay=5, min_delay=0.5, backoff=2,
+    max_limit=1 << 22, raw=False):
     """Job log generator.
 
     :param job: job name
-    :param delay: time in seconds between each server poll
+    :param delay: cf. :meth:`logs`
+    :param min_delay: cf. :meth:`logs`
+    :param backoff: cf. :meth:`logs`
+    :param max_limit: cf. :meth:`logs`
+    :param raw: cf. :meth:`logs`
 
     Yields line by line.
 
     """
-    finishing = False
-    offset = 0
-    while True:
+    tail = _LogTail(min_delay, delay, backoff, max_limit=max_limit, raw=raw)
+    return self._follow_job_logs(job, tail, delay, Event())
+
+  def _follow_job_logs(self, job, tail, delay, stopped):
+    """Job log generator, which can be stopped while waiting for new logs.
+
+    :param job: job name
+    :param tail: :class:`_LogTail` instance
+    :param delay: cf. :meth:`logs`
+    :param stopped: `threading.Event`, the generator returns as soon as it is
+      set (even if no new lines are found)
+
+    """
+    for line in _replay_logs(self._session, self.exec_id, tail, job):
+      yield line
+    while not tail.done:
       try:
         logs = self._session.get_job_logs(
           exec_id=self.exec_id,
           job=job,
-          offset=offset,
+          offset=tail.offset,
+          limit=tail.limit,
         )
       except HTTPError as err:
         # if Azkaban is hanging, the job might be stuck in preparing stage
         preparing = False
         while True:
-          sleep(delay)
-          preparing_jobs = set(
-            e['id']
-            for e in self.status['nodes']
-            if e['status'] == 'PREPARING'
-          )
-          if job in preparing_jobs:
+          if stopped.wait(delay):
+            return
+          if self.monitor.snapshot(delay).get_status(job) == 'PREPARING':
             if not preparing:
               preparing = True
               _logger.debug(
@@ -1022,22 +2812,272 @@ class Execution(object):
           # something else is causing the error
           raise err
       else:
-        if logs['length']:
-          offset += logs['length']
-          lines = (e for e in logs['data'].split('\n') if e)
-          for line in lines:
-            yield line
-        elif finishing:
+        for line in _consume_logs(
+          self._session, self.exec_id, tail, logs, job
+        ):
+          yield line
+        if tail.done:
           break
+        if tail.status_due:
+          _report_job_status(tail, self.monitor.snapshot(delay), job)
+        if stopped.wait(tail.delay):
+          return
+
+  def grep_logs(self, pattern, max_count=None, context=0, **kwargs):
+    """Filtered execution log generator.
+
+    :param pattern: regular expression (string or compiled) searched in each
+      line, strings are compiled with `re.MULTILINE` so that `^` and `$` match
+      at the start and end of lines
+    :param max_count: maximum number of matching lines, once reached no
+      further logs are fetched
+    :param context: number of lines to also yield before and after each
+      matching line, non-contiguous groups being separated by `'--'`
+    :param kwargs: keyword arguments forwarded to :meth:`logs`
+
+    Yields matching lines (and their context). Each page of logs is searched
+    as a whole, which is much faster than matching lines individually.
+
+    """
+    return _grep_logs(
+      self.logs(raw=True, **kwargs), pattern, max_count, context
+    )
+
+  def grep_job_logs(self, job, pattern, max_count=None, context=0, **kwargs):
+    """Filtered job log generator.
+
+    :param job: job name
+    :param pattern: cf. :meth:`grep_logs`
+    :param max_count: cf. :meth:`grep_logs`
+    :param context: cf. :meth:`grep_logs`
+    :param kwargs: keyword arguments forwarded to :meth:`job_logs`
+
+    """
+    return _grep_logs(
+      self.job_logs(job, raw=True, **kwargs), pattern, max_count, context
+    )
+
+  def logs_tail(self, lines=100, window=1 << 16):
+    """Last lines of the execution's logs.
+
+    :param lines: Number of lines.
+    :param window: Size in bytes of the first page of logs fetched from the
+      end. Pages are fetched backwards, doubling in size each time, until
+      enough lines are found.
+
+    Returns a list of lines. Only the end of the log is downloaded (its size
+    is first found by probing a few bytes at increasing offsets), so this is
+    cheap even for very large logs.
+
+    """
+    return _read_log_tail(self._fetch_logs, lines, window)
+
+  def job_logs_tail(self, job, lines=100, window=1 << 16):
+    """Last lines of a job's logs.
+
+    :param job: job name
+    :param lines: cf. :meth:`logs_tail`
+    :param window: cf. :meth:`logs_tail`
+
+    """
+    return _read_log_tail(partial(self._fetch_logs, job=job), lines, window)
+
+  def logs_range(self, start=0, end=None):
+    """Part of the execution's logs, as currently available.
+
+    :param start: Offset in bytes to start reading from.
+    :param end: Offset in bytes to stop reading at. Defaults to the current end
+      of the log.
+
+    Yields chunks of logs (not lines).
+
+    """
+    return _read_log_range(self._fetch_logs, start, end)
+
+  def job_logs_range(self, job, start=0, end=None):
+    """Part of a job's logs, as currently available.
+
+    :param job: job name
+    :param start: cf. :meth:`logs_range`
+    :param end: cf. :meth:`logs_range`
+
+    """
+    return _read_log_range(partial(self._fetch_logs, job=job), start, end)
+
+  def export(self, path, compress=False, max_concurrency=None):
+    """Save the execution's status and all its logs to a directory.
+
+    :param path: Directory. It will be created if it doesn't exist.
+    :param compress: Gzip log files.
+    :param max_concurrency: Maximum number of logs downloaded at once.
+      Defaults to the size of the session's connection pool.
+
+    The status is saved as `status.json`, the execution's logs as
+    `execution.log` and each job's logs (including jobs of embedded flows) as
+    `jobs/JOB.log` (`jobs/FLOW/JOB.log` for embedded ones). Logs are streamed
+    to their files page by page, so they are never held in memory. Returns the
+    list of paths written. If some logs can't be downloaded (or a job's name
+    can't safely be used as a file name), the others are still saved before an
+    error is raised.
+
+    """
+    status = self.status
+    if not exists(path):
+      os.makedirs(path)
+    status_path = join(path, 'status.json')
+    with open(status_path, 'w') as writer:
+      json.dump(status, writer, indent=2, sort_keys=True)
+    jobs = [None] # the execution's own logs
+    jobs.extend(ExecutionSnapshot(status).get_jobs(*_STARTED_STATUSES))
+
+    def _save(job):
+      """Stream a log to its file, capturing any error."""
+      try:
+        name = _get_log_path(job) if job else 'execution.log'
+      except AzkabanError as err:
+        _logger.warning('Unable to export %s: %s', job, err)
+        return job, err
+      if compress:
+        log_path, opener = join(path, '%s.gz' % (name, )), gzip.open
+      else:
+        log_path, opener = join(path, name), io.open
+      try:
+        if not exists(dirname(log_path)):
+          try:
+            os.makedirs(dirname(log_path))
+          except OSError: # created concurrently
+            pass
+        with opener(log_path, 'wb') as writer:
+          for chunk in _read_log_range(partial(self._fetch_logs, job=job), 0):
+            writer.write(chunk.encode('utf-8'))
+      except (AzkabanError, rq.RequestException, ValueError) as err:
+        _logger.warning('Unable to export %s: %s', name, err)
+        return log_path, err
+      return log_path, None
+
+    paths = [status_path]
+    errors = []
+    pool = ThreadPool(max_concurrency or self._session.pool_maxsize)
+    try:
+      for log_path, err in pool.imap_unordered(_save, jobs):
+        if err:
+          errors.append(log_path)
         else:
-          running_jobs = set(
-            e['id']
-            for e in self.status['nodes']
-            if e['status'] == 'RUNNING'
+          paths.append(log_path)
+    finally:
+      pool.terminate()
+    if errors:
+      raise AzkabanError(
+        'Unable to export %s log(s): %s.', len(errors), ', '.join(errors)
+      )
+    return paths
+
+  def all_job_logs(self, delay=5, max_concurrency=None, min_delay=0.5,
+    backoff=2, max_limit=1 << 22, raw=False, pattern=None, max_count=None,
+    context=0):
+    """Multiplexed log generator for all jobs of the execution.
+
+    :param delay: time in seconds between each check for newly started jobs
+      (also used as maximum poll delay for each job's logs)
+    :param max_concurrency: maximum number of jobs followed at once, defaults
+      to the size of the session's connection pool
+    :param min_delay: cf. :meth:`logs`
+    :param backoff: cf. :meth:`logs`
+    :param max_limit: cf. :meth:`logs`
+    :param raw: cf. :meth:`logs` (ignored if `pattern` is specified)
+    :param pattern: if specified, only lines matching it are yielded (cf.
+      :meth:`grep_logs`), each job's pages being searched as a whole
+    :param max_count: cf. :meth:`grep_logs`, applies to each job separately
+    :param context: cf. :meth:`grep_logs`, applies to each job separately
+
+    Yields `(job, line)` tuples. Jobs (including those inside embedded flows)
+    are followed concurrently as soon as they are found to have started (once
+    a follower is available), until the execution and all followed jobs are
+    over. Closing the generator stops all followers.
+
+    """
+    max_concurrency = max_concurrency or self._session.pool_maxsize
+    lines = Queue(maxsize=64 * max_concurrency)
+    closed = Event()
+
+    def _put(item):
+      """Push an item to the queue, unless the generator was closed."""
+      while not closed.is_set():
+        try:
+          lines.put(item, timeout=delay)
+        except Full:
+          continue
+        return
+
+    def _follow(job):
+      """Push a job's lines to the queue, followed by `None` when done."""
+      tail = _LogTail(
+        min_delay, delay, backoff, max_limit=max_limit,
+        raw=raw or pattern is not None,
+      )
+      job_lines = self._follow_job_logs(job, tail, delay, closed)
+      if pattern is not None:
+        job_lines = _grep_logs(job_lines, pattern, max_count, context)
+      try:
+        for line in job_lines:
+          _put((job, line))
+      except (AzkabanError, HTTPError) as err:
+        _logger.warning('Unable to follow job %s logs: %s', job, err)
+      finally:
+        _put((job, None))
+
+    followed = set()
+    waiting = deque() # started jobs not yet followed
+    active = 0
+    finished = False
+    next_check = 0
+    try:
+      while True:
+        if not finished and time() >= next_check:
+          snapshot = self.monitor.snapshot(delay)
+          for job in snapshot.get_jobs(*_STARTED_STATUSES):
+            if not job in followed:
+              followed.add(job)
+              waiting.append(job)
+          finished = snapshot.finished
+          next_check = time() + delay
+        while waiting and active < max_concurrency:
+          job = waiting.popleft()
+          _logger.debug('Following job %s logs.', job)
+          active += 1
+          thread = Thread(target=_follow, args=(job, ))
+          thread.daemon = True
+          thread.start()
+        if finished and not active and not waiting:
+          break
+        try:
+          job, line = lines.get(
+            timeout=delay if finished else max(0, next_check - time())
           )
-          if job not in running_jobs:
-            finishing = True
-      sleep(delay)
+        except Empty:
+          continue
+        if line is None:
+          active -= 1
+        else:
+          yield job, line
+    finally:
+      closed.set()
+
+  def _fetch_logs(self, offset, limit, job=None):
+    """Fetch a page of the execution's (or one of its jobs') logs.
+
+    :param offset: Log offset.
+    :param limit: Size of log to download.
+    :param job: Job name, `None` for the execution's logs.
+
+    """
+    if job:
+      return self._session.get_job_logs(
+        exec_id=self.exec_id, job=job, offset=offset, limit=limit
+      )
+    return self._session.get_execution_logs(
+      exec_id=self.exec_id, offset=offset, limit=limit
+    )
 
   @classmethod
   def start(cls, session, *args, **kwargs):
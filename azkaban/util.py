@@ -8,24 +8,35 @@ from functools import wraps
 from itertools import chain
 from logging.handlers import TimedRotatingFileHandler
 from mimetypes import guess_type
-from os import close, remove
+from os import close, fdopen, remove
 from os.path import exists, expanduser
-from requests.packages.urllib3 import disable_warnings
 from requests.packages.urllib3.filepost import choose_boundary
-from six import b, string_types
+from six import StringIO, b, string_types
 from six.moves.configparser import (NoOptionError, NoSectionError,
   ParsingError, RawConfigParser)
+from stat import S_IMODE
 from tempfile import gettempdir, mkstemp
+from threading import Lock
+from time import sleep, time
 from traceback import print_exc
 import logging as lg
+import os
 import os.path as osp
 import re
 import sys
 import warnings as wr
 
+try:
+  import fcntl
+except ImportError:
+  fcntl = None # not available on windows
+
 
 _logger = lg.getLogger(__name__)
 
+# `os.rename` doesn't overwrite existing files on Windows.
+_replace = getattr(os, 'replace', os.rename)
+
 
 class AzkabanError(Exception):
 
@@ -46,8 +57,7 @@ class Adapter(lg.LoggerAdapter):
   """
 
   def __init__(self, prefix, logger, extra=None):
-    lg.LoggerAdapter.__init__(self, logger, extra)
-    # not using super since `LoggerAdapter` is an old-style class in python 2.6
+    super(Adapter, self).__init__(logger, extra)
     self.prefix = prefix
 
   def process(self, msg, kwargs):
@@ -67,27 +77,72 @@ class Config(object):
   :param path: path to configuration file. If no file exists at that location,
     the configuration parser will be empty. Defaults to `~/.azkabanrc`.
 
+  Each instantiation reads the file again. Use :meth:`shared` to get an
+  instance cached for the whole process instead.
+
   """
 
+  _instances = {}
+  _instances_lock = Lock()
+
   def __init__(self, path=None):
     self.parser = RawConfigParser()
     self.path = path or expanduser('~/.azkabanrc')
     # TODO: make the default path be configurable via an environment variable.
+    self._contents = '' # last contents read from or written to the file
     if exists(self.path):
       try:
         self.parser.read(self.path)
       except ParsingError:
         raise AzkabanError('Invalid configuration file %r.', self.path)
       else:
+        self._contents = self._serialize()
         # TODO: remove this in 1.0.
         self._convert_aliases()
         self.save()
-        self.parser.read(self.path)
 
   def save(self):
-    """Save configuration parser back to file."""
-    with open(self.path, 'w') as writer:
-      self.parser.write(writer)
+    """Save configuration parser back to file.
+
+    The file is only written if its contents changed. The write is atomic, so
+    concurrent readers will never see a partially written file.
+
+    """
+    contents = self._serialize()
+    if contents != self._contents:
+      _logger.debug('Saving configuration to %r.', self.path)
+      write_atomically(self.path, contents)
+      self._contents = contents
+
+  def reload(self):
+    """Read the configuration file again.
+
+    Any changes which weren't saved are lost.
+
+    """
+    parser = RawConfigParser()
+    if exists(self.path):
+      try:
+        parser.read(self.path)
+      except ParsingError:
+        raise AzkabanError('Invalid configuration file %r.', self.path)
+    self.parser = parser
+    self._contents = self._serialize()
+
+  def lock(self):
+    """Lock the configuration file across processes.
+
+    Usage::
+
+      with config.lock():
+        config.reload()
+        # update config.parser
+        config.save()
+
+    Cf. :func:`lock_file`.
+
+    """
+    return lock_file(self.path)
 
   def get_option(self, command, name, default=None):
     """Get option value for a command.
@@ -136,6 +191,27 @@ class Config(object):
       handler.setFormatter(lg.Formatter(handler_format))
       return handler
 
+  def _serialize(self):
+    """Get the configuration file contents corresponding to the parser."""
+    writer = StringIO()
+    self.parser.write(writer)
+    return writer.getvalue()
+
+  @classmethod
+  def shared(cls, path=None):
+    """Get process-wide configuration.
+
+    :param path: Cf. :class:`Config`.
+
+    The file is only read the first time a given path is requested.
+
+    """
+    path = path or expanduser('~/.azkabanrc')
+    with cls._instances_lock:
+      if not path in cls._instances:
+        cls._instances[path] = cls(path)
+      return cls._instances[path]
+
   def _convert_aliases(self):
     """Convert old-style aliases to new-style."""
     parser = self.parser
@@ -150,6 +226,73 @@ class Config(object):
       parser.remove_section('alias')
 
 
+class RateLimiter(object):
+
+  """Token bucket rate limiter.
+
+  :param rate: Number of tokens added to the bucket per second.
+  :param burst: Capacity of the bucket, i.e. the number of tokens which can be
+    consumed at once after an idle period. Defaults to `max(1, rate)`.
+
+  Calls to :meth:`acquire` block until a token is available. Instances are
+  thread-safe and serve waiting threads in order. To share a limiter between
+  all sessions of a process talking to the same server, use :meth:`shared`.
+
+  """
+
+  _instances = {}
+  _instances_lock = Lock()
+
+  def __init__(self, rate, burst=None):
+    if rate <= 0:
+      raise ValueError('Invalid rate: %r.' % (rate, ))
+    self.rate = float(rate)
+    self.burst = float(burst or max(1, rate))
+    self._tokens = self.burst
+    self._updated = time()
+    self._lock = Lock()
+
+  def __repr__(self):
+    return '<%s(rate=%s, burst=%s)>' % (
+      self.__class__.__name__, self.rate, self.burst
+    )
+
+  def acquire(self):
+    """Consume a token, waiting until one is available.
+
+    Returns the time waited in seconds.
+
+    """
+    with self._lock:
+      now = time()
+      self._tokens = min(
+        self.burst, self._tokens + (now - self._updated) * self.rate
+      )
+      self._updated = now
+      # tokens can go negative: each waiting caller reserves its own token
+      self._tokens -= 1
+      delay = - self._tokens / self.rate if self._tokens < 0 else 0
+    if delay:
+      sleep(delay)
+    return delay
+
+  @classmethod
+  def shared(cls, key, rate, burst=None):
+    """Get process-wide limiter.
+
+    :param key: Key identifying the limiter (e.g. a server URL).
+    :param rate: Cf. :class:`RateLimiter`. Only used when the limiter is
+      first created.
+    :param burst: Cf. :class:`RateLimiter`. Only used when the limiter is
+      first created.
+
+    """
+    with cls._instances_lock:
+      if not key in cls._instances:
+        cls._instances[key] = cls(rate, burst)
+      return cls._instances[key]
+
+
 class MultipartForm(object):
 
   """Form allowing streaming.
@@ -157,7 +300,8 @@ class MultipartForm(object):
   :param files: List of filepaths. For more control, each file can also be
     represented as a dictionary with keys `'path'`, `'name'`, and `'type'`.
   :param params: Optional dictionary of parameters that will be included in the
-    form.
+    form. It is available as the `params` attribute and only read when the form
+    is streamed, so parameters can be updated until then.
   :param callback: Arguments `cur_bytes`, `tot_bytes`, `index`.
   :param chunksize: Size of each streamed file chunk.
 
@@ -174,7 +318,7 @@ class MultipartForm(object):
 
   def __init__(self, files, params=None, callback=None, chunksize=4096):
     self._boundary = choose_boundary()
-    self._params = params
+    self.params = params or {}
     self._callback = callback
     self._chunksize = chunksize
     # generate content type header
@@ -197,10 +341,10 @@ class MultipartForm(object):
       cur_bytes = 0
       tot_bytes = self.size
       # start the content body with the form parameters
-      if self._params:
+      if self.params:
         params_content = b(''.join(
           '%s%s' % (self._get_section_header(name), content)
-          for name, content in self._params.items()
+          for name, content in self.params.items()
         ))
       else:
         params_content = b''
@@ -289,6 +433,31 @@ def temppath():
     if exists(path):
       remove(path)
 
+@contextmanager
+def lock_file(path):
+  """Lock a file across processes.
+
+  :param path: Path to file (it doesn't need to exist).
+
+  Usage::
+
+    with lock_file(path):
+      # read and update the file
+
+  This uses an advisory lock on a separate `.lock` file next to the file, and
+  is a no-op on platforms without `fcntl`.
+
+  """
+  if not fcntl:
+    yield
+    return
+  with open('%s.lock' % (path, ), 'a') as handle:
+    fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+    try:
+      yield
+    finally:
+      fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
 def catch(*error_classes):
   """Returns a decorator that catches errors and prints messages to stderr.
 
@@ -418,9 +587,33 @@ def stream_file(path, chunksize):
       else:
         break
 
-def suppress_urllib_warnings():
-  """Capture urllib warnings if possible, else disable them (python 2.6)."""
+def write_atomically(path, contents):
+  """Write contents to a file atomically.
+
+  :param path: Path to file. Any existing file will be overwritten.
+  :param contents: String to write.
+
+  The contents are first written to a temporary file in the same directory,
+  which is then renamed. Readers will therefore never see a partially written
+  file, even if several processes write to the same path concurrently. The
+  permissions of any existing file are preserved (new files are only readable
+  by their owner). If the path is a symbolic link, its target is written.
+
+  """
+  path = osp.realpath(path)
+  dirpath, filename = osp.split(path)
+  (desc, temp_path) = mkstemp(prefix='.%s.' % (filename, ), dir=dirpath)
   try:
-    lg.captureWarnings(True)
-  except AttributeError:
-    disable_warnings()
+    with fdopen(desc, 'w') as writer:
+      writer.write(contents)
+    if exists(path):
+      os.chmod(temp_path, S_IMODE(os.stat(path).st_mode))
+    _replace(temp_path, path)
+  except Exception:
+    if exists(temp_path):
+      remove(temp_path)
+    raise
+
+def suppress_urllib_warnings():
+  """Capture urllib warnings, so that they are logged rather than printed."""
+  lg.captureWarnings(True)
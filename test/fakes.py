@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""Fakes shared by tests."""
+
+from azkaban.util import AzkabanError
+from contextlib import contextmanager
+from six import StringIO
+from threading import Lock, current_thread
+from time import sleep
+import azkaban.__main__
+import sys
+
+
+class FakeSession(object):
+
+  """Stub :class:`~azkaban.remote.Session`, serving canned statuses and logs.
+
+  :param statuses: List of execution statuses, returned in turn by
+    :meth:`get_execution_status` (the last one is then repeated).
+  :param logs: Logs keyed by job, `None` for the execution's logs.
+  :param log_cache: Session's :class:`~azkaban.cache.LogCache`.
+  :param pool_maxsize: Session's connection pool size.
+  :param delay: Time in seconds each request takes.
+
+  Requests are recorded: `requests` counts status requests (and `threads`
+  holds the threads which made them), `fetches` lists the `(job, offset)` of
+  each log request, and `max_active` is the largest number of log requests
+  which were in flight at once.
+
+  """
+
+  url = 'http://foo'
+
+  def __init__(self, statuses=None, logs=None, log_cache=None, pool_maxsize=10,
+    delay=0):
+    self.statuses = statuses or []
+    self.logs = logs or {}
+    self.log_cache = log_cache
+    self.pool_maxsize = pool_maxsize
+    self.delay = delay
+    self.requests = 0
+    self.threads = set()
+    self.fetches = []
+    self.active = 0
+    self.max_active = 0
+    self._lock = Lock()
+
+  def close(self):
+    pass
+
+  def get_execution_status(self, exec_id):
+    with self._lock:
+      self.threads.add(current_thread())
+      status = self.statuses[min(self.requests, len(self.statuses) - 1)]
+      self.requests += 1
+    sleep(self.delay)
+    return status
+
+  def get_execution_logs(self, exec_id, offset, limit):
+    return self.get_job_logs(exec_id, None, offset, limit)
+
+  def get_job_logs(self, exec_id, job, offset, limit):
+    with self._lock:
+      self.fetches.append((job, offset))
+      self.active += 1
+      self.max_active = max(self.max_active, self.active)
+    sleep(self.delay)
+    with self._lock:
+      self.active -= 1
+    if not job in self.logs:
+      raise AzkabanError('Missing logs for %s.', job)
+    data = self.logs[job][offset:offset + limit]
+    return {'data': data, 'offset': offset, 'length': len(data)}
+
+
+@contextmanager
+def mock_session(session):
+  """Make CLI commands use a given session, capturing their output.
+
+  :param session: Session returned for any URL or alias.
+
+  Yields the buffer standard output is redirected to.
+
+  """
+  get_session = azkaban.__main__._get_session
+  stdout = sys.stdout
+  azkaban.__main__._get_session = lambda url, alias: session
+  sys.stdout = StringIO()
+  try:
+    yield sys.stdout
+  finally:
+    azkaban.__main__._get_session = get_session
+    sys.stdout = stdout
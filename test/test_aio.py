@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""Test Azkaban asyncio module."""
+
+from fakes import FakeSession
+from nose.tools import eq_, ok_
+from nose.plugins.skip import SkipTest
+from threading import current_thread
+
+try:
+  from azkaban.aio import AsyncExecution, AsyncSession
+  import asyncio
+except (ImportError, SyntaxError): # python < 3.6
+  AsyncSession = None
+
+
+class _TestAsync(object):
+
+  def setup(self):
+    if not AsyncSession:
+      raise SkipTest
+    self.loop = asyncio.new_event_loop()
+
+  def teardown(self):
+    self.loop.close()
+
+  def _collect(self, generator):
+    """Consume an asynchronous generator."""
+    items = []
+    while True:
+      try:
+        items.append(self.loop.run_until_complete(generator.__anext__()))
+      except StopAsyncIteration:
+        return items
+
+
+class TestAsyncSession(_TestAsync):
+
+  def test_delegate(self):
+    session = FakeSession([{'status': 'RUNNING'}])
+    async_session = AsyncSession(session)
+    status = self.loop.run_until_complete(
+      async_session.get_execution_status(1)
+    )
+    eq_(status, {'status': 'RUNNING'})
+    ok_(not current_thread() in session.threads) # ran in the worker pool
+    async_session.close()
+
+  def test_method_metadata(self):
+    method = AsyncSession.get_execution_status
+    eq_(method.__name__, 'get_execution_status')
+    ok_('azkaban.remote.Session.get_execution_status' in method.__doc__)
+
+
+class TestAsyncExecution(_TestAsync):
+
+  def test_logs(self):
+    session = FakeSession(
+      [{'status': 'SUCCEEDED', 'nodes': []}], {None: 'a\nb\nc'}
+    )
+    execution = AsyncExecution(AsyncSession(session), 1)
+    eq_(
+      self._collect(execution.logs(delay=0.01, min_delay=0.01)),
+      ['a', 'b', 'c']
+    )
+
+  def test_logs_running(self):
+    session = FakeSession(
+      [{'status': 'RUNNING'}, {'status': 'SUCCEEDED', 'nodes': []}],
+      {None: 'a\n'},
+    )
+    execution = AsyncExecution(AsyncSession(session), 1)
+    eq_(self._collect(execution.logs(delay=0.01, min_delay=0.01)), ['a'])
+    ok_(session.requests >= 2)
+
+  def test_events(self):
+    session = FakeSession([
+      {'status': 'RUNNING', 'nodes': [{'id': 'foo', 'status': 'RUNNING'}]},
+      {'status': 'RUNNING', 'nodes': [{'id': 'foo', 'status': 'SUCCEEDED'}]},
+      {'status': 'SUCCEEDED', 'nodes': [{'id': 'foo', 'status': 'SUCCEEDED'}]},
+    ])
+    execution = AsyncExecution(AsyncSession(session), 1)
+    events = self._collect(execution.events(delay=0))
+    eq_(
+      [(event.job, event.old_status, event.new_status) for event in events],
+      [('foo', 'RUNNING', 'SUCCEEDED'), (None, 'RUNNING', 'SUCCEEDED')]
+    )
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""Test Azkaban cache module."""
+
+from azkaban.cache import *
+from azkaban.util import temppath
+from nose.tools import eq_, ok_, raises, nottest
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import sleep
+import os
+
+
+class TestMetadataCache(object):
+
+  def test_get_missing(self):
+    cache = MetadataCache()
+    eq_(cache.get(('a', 'b')), None)
+    eq_(cache.get(('a', 'b'), 1), 1)
+
+  def test_set_get(self):
+    cache = MetadataCache()
+    cache.set(('a', 'b'), {'c': 1})
+    eq_(cache.get(('a', 'b')), {'c': 1})
+
+  def test_expired(self):
+    cache = MetadataCache(ttl=0.01)
+    cache.set(('a', ), 1)
+    sleep(0.02)
+    eq_(cache.get(('a', )), None)
+
+  def test_evict_least_recently_used(self):
+    cache = MetadataCache(max_size=2)
+    cache.set(('a', ), 1)
+    cache.set(('b', ), 2)
+    cache.get(('a', ))
+    cache.set(('c', ), 3)
+    eq_(len(cache), 2)
+    eq_(cache.get(('a', )), 1)
+    eq_(cache.get(('b', )), None)
+
+  def test_invalidate_prefix(self):
+    cache = MetadataCache()
+    cache.set(('url', 'foo', 'id'), 1)
+    cache.set(('url', 'foo', 'flow', 'bar'), 2)
+    cache.set(('url', 'foobar', 'id'), 3)
+    cache.invalidate('url', 'foo')
+    eq_(cache.get(('url', 'foo', 'id')), None)
+    eq_(cache.get(('url', 'foo', 'flow', 'bar')), None)
+    eq_(cache.get(('url', 'foobar', 'id')), 3)
+
+  def test_persisted(self):
+    with temppath() as path:
+      cache = MetadataCache(path=path)
+      cache.set(('url', 'foo', 'id'), 1)
+      eq_(MetadataCache(path=path).get(('url', 'foo', 'id')), 1)
+      cache.invalidate('url')
+      eq_(MetadataCache(path=path).get(('url', 'foo', 'id')), None)
+      os.remove('%s.lock' % (path, ))
+
+  def test_persisted_merged(self):
+    with temppath() as path:
+      cache = MetadataCache(path=path)
+      other_cache = MetadataCache(path=path)
+      cache.set(('url', 'foo', 'id'), 1)
+      other_cache.set(('url', 'bar', 'id'), 2)
+      cache.invalidate('url', 'bar')
+      other_cache.set(('url', 'baz', 'id'), 3) # doesn't restore `bar`
+      eq_(other_cache.get(('url', 'bar', 'id')), None)
+      eq_(other_cache.get(('url', 'foo', 'id')), 1)
+      cache = MetadataCache(path=path)
+      eq_(cache.get(('url', 'foo', 'id')), 1)
+      eq_(cache.get(('url', 'bar', 'id')), None)
+      eq_(cache.get(('url', 'baz', 'id')), 3)
+      os.remove('%s.lock' % (path, ))
+
+  def test_copies(self):
+    cache = MetadataCache()
+    value = {'flows': ['a']}
+    cache.set(('a', ), value)
+    value['flows'].append('b')
+    cache.get(('a', ))['flows'].append('c')
+    eq_(cache.get(('a', )), {'flows': ['a']})
+
+
+class TestLogCache(object):
+
+  def setup(self):
+    self.path = mkdtemp()
+
+  def teardown(self):
+    rmtree(self.path)
+
+  def test_get_missing(self):
+    eq_(LogCache(self.path).get(('url', '1', '')), None)
+
+  def test_update_read(self):
+    cache = LogCache(self.path)
+    cache.update(('url', '1', ''), u'a\nb', 0, 3)
+    cache.update(('url', '1', ''), u'\xe9\n', 3, 6)
+    eq_(cache.get(('url', '1', '')), (6, False))
+    eq_(''.join(cache.read(('url', '1', ''), chunk_size=3)), u'a\nb\xe9\n')
+
+  def test_update_not_contiguous(self):
+    cache = LogCache(self.path)
+    cache.update(('url', '1', ''), 'a\n', 2, 4)
+    eq_(cache.get(('url', '1', '')), None)
+    cache.update(('url', '1', ''), 'a\n', 0, 2)
+    cache.update(('url', '1', ''), 'b\n', 4, 6)
+    eq_(cache.get(('url', '1', '')), (2, False))
+
+  def test_complete_persisted(self):
+    LogCache(self.path).update(('url', '1', 'foo'), 'a\n', 0, 2, complete=True)
+    cache = LogCache(self.path)
+    eq_(cache.get(('url', '1', 'foo')), (2, True))
+    eq_(list(cache.read(('url', '1', 'foo'))), ['a\n'])
+
+  def test_evict(self):
+    cache = LogCache(self.path, max_size=4)
+    cache.update(('url', '1', ''), 'ab', 0, 2)
+    cache.update(('url', '2', ''), 'cd', 0, 2)
+    cache.get(('url', '1', ''))
+    cache.update(('url', '3', ''), 'ef', 0, 2)
+    eq_(len(cache), 2)
+    eq_(cache.get(('url', '2', '')), None)
+    ok_(cache.get(('url', '1', '')))
+
+  def test_evict_shared(self):
+    cache = LogCache(self.path, max_size=4)
+    other_cache = LogCache(self.path, max_size=4)
+    cache.update(('url', '1', ''), 'ab', 0, 2, complete=True)
+    other_cache.update(('url', '2', ''), 'cd', 0, 2, complete=True)
+    cache.update(('url', '3', ''), 'ef', 0, 2, complete=True)
+    eq_(len([name for name in os.listdir(self.path) if '.log' in name]), 2)
+    new_cache = LogCache(self.path)
+    eq_(len(new_cache), 2)
+    eq_(new_cache.get(('url', '1', '')), None)
+    eq_(len(cache), 1) # the evicted log was also dropped from memory
+
+  def test_evict_orphans(self):
+    orphan_path = os.path.join(self.path, '%s.log' % ('0' * 40, ))
+    with open(orphan_path, 'w') as writer:
+      writer.write('orphan')
+    cache = LogCache(self.path, max_size=4)
+    cache.update(('url', '1', ''), 'ab', 0, 2, complete=True)
+    ok_(not os.path.exists(orphan_path))
+    eq_(cache.get(('url', '1', '')), (2, True))
+
+  def test_shared_directory(self):
+    key = ('url', '1', '')
+    cache = LogCache(self.path)
+    other_cache = LogCache(self.path)
+    cache.update(key, 'aa\n', 0, 3)
+    cache.update(key, 'bb\n', 3, 6)
+    other_cache.update(key, 'aa\n', 0, 3) # rewrites the log from its start
+    cache.update(key, 'cccc\n', 6, 11)
+    eq_(cache.get(key), None)
+    other_cache.update(key, 'bb\n', 3, 6)
+    eq_(other_cache.get(key), (6, False))
+    eq_(''.join(other_cache.read(key)), 'aa\nbb\n')
+    other_cache.flush()
+    eq_(''.join(LogCache(self.path).read(key)), 'aa\nbb\n')
+
+  def test_index_merged(self):
+    cache = LogCache(self.path)
+    other_cache = LogCache(self.path)
+    cache.update(('url', '1', ''), 'a\n', 0, 2, complete=True)
+    other_cache.update(('url', '2', ''), 'b\n', 0, 2, complete=True)
+    eq_(len(LogCache(self.path)), 2)
+
+  def test_index_saved_in_batches(self):
+    cache = LogCache(self.path, save_interval=60)
+    cache.update(('url', '1', ''), 'a\n', 0, 2)
+    cache.update(('url', '1', ''), 'b\n', 2, 4)
+    eq_(LogCache(self.path).get(('url', '1', '')), None)
+    cache.flush()
+    eq_(LogCache(self.path).get(('url', '1', '')), (4, False))
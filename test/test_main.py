@@ -3,9 +3,11 @@
 
 """Test CLI."""
 
-from azkaban.__main__ import _parse_project, main
+from azkaban.__main__ import (_parse_project, export_execution, main,
+  run_workflow, view_log)
 from azkaban.util import AzkabanError
 from contextlib import contextmanager
+from fakes import FakeSession, mock_session
 from nose.tools import *
 from shutil import rmtree
 from tempfile import mkdtemp
@@ -100,3 +102,119 @@ class TestParseProject(object):
 class TestMain(object):
 
   pass # TODO: add test for the CLI
+
+
+class TestRunWait(object):
+
+  class _Session(FakeSession):
+
+    def run_workflow(self, **kwargs):
+      return {'execid': 42}
+
+  def _run(self, session):
+    with mock_session(session) as stdout:
+      run_workflow(
+        'foo', 'bar', [], None, None, False, False, [], [], False, None, True
+      )
+      return stdout.getvalue()
+
+  def test_succeeded(self):
+    session = self._Session([{'status': 'RUNNING'}, {'status': 'SUCCEEDED'}])
+    ok_('Execution 42 succeeded.' in self._run(session))
+    eq_(session.requests, 2)
+
+  @raises(AzkabanError)
+  def test_failed(self):
+    self._run(self._Session([{'status': 'RUNNING'}, {'status': 'FAILED'}]))
+
+
+class TestViewLog(object):
+
+  def _view_log(self, **kwargs):
+    options = {
+      '_execution': 1, '_job': [], '_url': None, '_alias': None,
+      '_all_jobs': True, '_head': None, '_tail': None, '_bytes': None,
+      '_grep': None, '_max_count': None, '_context': None,
+    }
+    options.update(kwargs)
+    session = FakeSession(
+      [{'status': 'SUCCEEDED', 'nodes': [
+        {'id': 'foo', 'status': 'SUCCEEDED'},
+      ]}],
+      {'foo': 'a 1\nb 2\na 3\n'},
+    )
+    with mock_session(session) as stdout:
+      view_log(**options)
+      return stdout.getvalue()
+
+  def test_all_jobs_grep(self):
+    eq_(self._view_log(_grep='^a'), '[foo] a 1\n[foo] a 3\n')
+
+  def test_all_jobs_grep_options(self):
+    eq_(self._view_log(_grep='^a', _max_count='1'), '[foo] a 1\n')
+    eq_(
+      self._view_log(_grep='3', _context='1'),
+      '[foo] b 2\n[foo] a 3\n'
+    )
+
+  @raises(AzkabanError)
+  def test_invalid_max_count(self):
+    self._view_log(_grep='^a', _max_count='abc')
+
+  @raises(AzkabanError)
+  def test_negative_context(self):
+    self._view_log(_grep='^a', _context='-1')
+
+  def test_all_jobs_tail(self):
+    eq_(self._view_log(_tail='1'), '[foo] a 3\n')
+
+  @raises(AzkabanError)
+  def test_invalid_tail(self):
+    self._view_log(_tail='abc')
+
+  @raises(AzkabanError)
+  def test_negative_head(self):
+    self._view_log(_head='-1')
+
+  @raises(AzkabanError)
+  def test_all_jobs_bytes(self):
+    self._view_log(_bytes='1:')
+
+
+class TestExport(object):
+
+  def setup(self):
+    self.path = mkdtemp()
+
+  def teardown(self):
+    rmtree(self.path)
+
+  def _export(self, compress):
+    session = FakeSession(
+      [{'status': 'SUCCEEDED', 'nodes': [
+        {'id': 'foo', 'status': 'SUCCEEDED'},
+      ]}],
+      {None: 'None\n', 'foo': 'foo\n'},
+      pool_maxsize=2,
+    )
+    with mock_session(session) as stdout:
+      export_execution(1, self.path, None, None, compress)
+      return stdout.getvalue()
+
+  def test_export(self):
+    output = self._export(False)
+    ok_(output.startswith('Execution 1 successfully exported'))
+    ok_('3 files' in output)
+    eq_(
+      sorted(os.listdir(self.path)),
+      ['execution.log', 'jobs', 'status.json']
+    )
+    eq_(os.listdir(osp.join(self.path, 'jobs')), ['foo.log'])
+
+  def test_export_gzip(self):
+    self._export(True)
+    eq_(
+      sorted(os.listdir(self.path)),
+      ['execution.log.gz', 'jobs', 'status.json']
+    )
+    eq_(os.listdir(osp.join(self.path, 'jobs')), ['foo.log.gz'])
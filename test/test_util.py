@@ -6,7 +6,11 @@
 from azkaban.util import *
 from contextlib import contextmanager
 from nose.tools import eq_, ok_, raises, nottest
+from shutil import rmtree
 from six import u
+from tempfile import mkdtemp
+import os
+import os.path as osp
 
 
 class TestFlatten(object):
@@ -72,6 +76,64 @@ class TestConfig(object):
       config = Config(path)
       config.get_option('cmd2', 'opt2')
 
+  def test_save_unchanged(self):
+    with temppath() as path:
+      with open(path, 'w') as writer:
+        writer.write('# comment\n[foo]\nbar=1\n')
+      config = Config(path)
+      config.save()
+      with open(path) as reader:
+        ok_(reader.read().startswith('# comment'))
+
+  def test_save_preserves_permissions(self):
+    with temppath() as path:
+      with open(path, 'w') as writer:
+        writer.write('[foo]\nbar = 1\n')
+      os.chmod(path, 0o640)
+      config = Config(path)
+      config.parser.set('foo', 'bar', 'hello')
+      config.save()
+      eq_(os.stat(path).st_mode & 0o777, 0o640)
+
+  def test_save_follows_symlink(self):
+    dpath = mkdtemp()
+    try:
+      target = osp.join(dpath, 'target')
+      link = osp.join(dpath, 'link')
+      with open(target, 'w') as writer:
+        writer.write('[foo]\nbar = 1\n')
+      os.symlink(target, link)
+      config = Config(link)
+      config.parser.set('foo', 'bar', 'hello')
+      config.save()
+      ok_(osp.islink(link))
+      eq_(Config(target).parser.get('foo', 'bar'), 'hello')
+    finally:
+      rmtree(dpath)
+
+  def test_reload_under_lock(self):
+    with temppath() as path:
+      with open(path, 'w') as writer:
+        writer.write('[foo]\nbar = 1\n')
+      config = Config(path)
+      other_config = Config(path)
+      other_config.parser.set('foo', 'baz', '2')
+      other_config.save()
+      with config.lock():
+        config.reload()
+        config.parser.set('foo', 'bar', '3')
+        config.save()
+      eq_(Config(path).parser.items('foo'), [('bar', '3'), ('baz', '2')])
+      os.remove('%s.lock' % (path, ))
+
+  def test_shared(self):
+    with temppath() as path:
+      with open(path, 'w') as writer:
+        writer.write('[foo]\nbar = 1\n')
+      config = Config.shared(path)
+      ok_(Config.shared(path) is config)
+      ok_(Config(path) is not config)
+
   def test_convert_aliases(self):
     with temppath() as path:
       with open(path, 'w') as writer:
@@ -154,3 +216,24 @@ class TestReadProperties(object):
     contents = 'a\=b = 5\nfoo\ bar :ja\n'
     with self.temp_properties(contents) as path:
       eq_(read_properties(path), {'a=b': '5', 'foo bar': 'ja'})
+
+
+class TestRateLimiter(object):
+
+  def test_burst(self):
+    limiter = RateLimiter(rate=10, burst=3)
+    eq_([limiter.acquire() for _ in range(3)], [0, 0, 0])
+
+  def test_wait(self):
+    limiter = RateLimiter(rate=100, burst=1)
+    limiter.acquire()
+    ok_(0 < limiter.acquire() <= 0.01)
+
+  def test_shared(self):
+    limiter = RateLimiter.shared('http://foo:123', 10)
+    ok_(RateLimiter.shared('http://foo:123', 20) is limiter)
+    ok_(RateLimiter.shared('http://bar:123', 10) is not limiter)
+
+  @raises(ValueError)
+  def test_invalid_rate(self):
+    RateLimiter(0)